@@ -4,141 +4,408 @@ Database Management Utilities for NCS Downloader
 Provides tools for database management, search, and analysis
 """
 
-import json
 import csv
 import os
+import re
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set, Iterator, Tuple, Union, Callable
 from datetime import datetime
 import argparse
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .json_io import load_json, dump_json, replace_json, format_json, dumps_line, read_appended
+except ImportError:
+    from json_io import load_json, dump_json, replace_json, format_json, dumps_line, read_appended
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    from ciso8601 import parse_datetime as _parse_datetime
+except ImportError:
+    def _parse_datetime(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+_ISO_DATE_PREFIX = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+# A search match: the track's ID and a reference to its stored data (not a copy)
+SearchHit = namedtuple('SearchHit', 'track_id data')
+
+
+def _download_date(download_timestamp: str) -> Optional[str]:
+    """Return the YYYY-MM-DD date of a download timestamp, or None if it cannot be parsed"""
+    # Timestamps written by the downloader are ISO 8601, so the date is the prefix
+    if _ISO_DATE_PREFIX.match(download_timestamp):
+        return download_timestamp[:10]
+    try:
+        return _parse_datetime(download_timestamp).strftime('%Y-%m-%d')
+    except:
+        return None
+
+
+def _make_matcher(patterns: List[str]) -> Callable[[str], bool]:
+    """Build a predicate telling whether a casefolded text contains any of the patterns"""
+    patterns = [pattern.casefold() for pattern in patterns]
+    
+    # A single Aho-Corasick pass replaces one substring scan per pattern
+    if ahocorasick is not None and len(patterns) > 1 and all(patterns):
+        automaton = ahocorasick.Automaton()
+        for pattern in patterns:
+            automaton.add_word(pattern, pattern)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text), None) is not None
+    
+    return lambda text: any(pattern in text for pattern in patterns)
+
+
+def _paths_exist(paths: List[str], max_workers: int = 32) -> List[bool]:
+    """Check which paths exist, overlapping the stat calls in a thread pool"""
+    if len(paths) < 2:
+        return [os.path.exists(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(os.path.exists, paths))
 
 class DatabaseManager:
     """Advanced database management for NCS tracks"""
     
-    def __init__(self, db_path: str = "ncs_downloads/tracks_database.json"):
+    def __init__(self, db_path: str = "ncs_downloads/tracks_database.json", streaming: bool = False):
+        """
+        Args:
+            db_path: Path to the tracks database
+            streaming: Read tracks lazily from disk instead of loading the whole
+                database; only read-only queries are available in this mode
+        """
         self.db_path = Path(db_path)
+        self.jsonl_path = self.db_path.with_suffix(".jsonl")
         self.data = {"tracks": {}}
+        self.streaming = streaming
+        if self.streaming and ijson is None:
+            print("ijson is not installed, loading the whole database instead")
+            self.streaming = False
         self.load_database()
     
     def load_database(self):
         """Load database from file"""
-        if self.db_path.exists():
+        if self.streaming:
+            print(f"Streaming tracks from: {self.db_path}")
+        elif self.db_path.exists():
             try:
-                with open(self.db_path, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
+                self.data = load_json(self.db_path)
                 print(f"Loaded {len(self.data.get('tracks', {}))} tracks from database")
             except Exception as e:
                 print(f"Error loading database: {e}")
                 self.data = {"tracks": {}}
         else:
             print(f"Database not found: {self.db_path}")
+        
+        if not self.streaming:
+            self.replay_appended_tracks()
+        
+        self.build_indices()
+    
+    def replay_appended_tracks(self):
+        """Apply tracks appended to the JSONL sidecar since the database was last saved"""
+        appended = self._read_sidecar()
+        self.data.setdefault("tracks", {}).update(appended)
+        
+        if appended:
+            print(f"Replayed {len(appended)} appended tracks from {self.jsonl_path}")
+    
+    def _read_sidecar(self) -> Dict[str, Dict[str, Any]]:
+        """Read the JSONL sidecar, reporting any lines that had to be skipped"""
+        appended, _, skipped = read_appended(self.jsonl_path)
+        if skipped:
+            print(f"Skipped {skipped} unreadable lines in {self.jsonl_path}")
+        return appended
     
-    def search_tracks(self, query: str, field: str = "all") -> List[Dict[str, Any]]:
+    def append_track(self, track_id: str, track_data: Dict[str, Any]):
+        """
+        Add or replace a single track by appending it to the JSONL sidecar
+        
+        Each call writes one line instead of rewriting the whole database;
+        save_database or compact folds the sidecar back into the main file.
+        """
+        with open(self.jsonl_path, 'ab') as f:
+            f.write(dumps_line({"id": track_id, **track_data}))
+        
+        is_new = track_id not in self.data["tracks"]
+        self.data["tracks"][track_id] = track_data
+        if is_new:
+            self._index_track(track_id, track_data)
+        else:
+            self.build_indices()
+    
+    def compact(self):
+        """Merge the JSONL sidecar into the database file"""
+        if not self.jsonl_path.exists():
+            print("Nothing to compact")
+            return
+        self.save_database()
+    
+    def build_indices(self):
+        """Build casefolded title/genre/artist and year lookup tables for the loaded tracks"""
+        self._title_cf: Dict[str, str] = {}
+        self._by_genre_cf: Dict[str, Set[str]] = {}
+        self._by_artist_cf: Dict[str, Set[str]] = {}
+        self._by_year: Dict[str, Set[str]] = {}
+        self._position: Dict[str, int] = {}
+        self._df = None
+        
+        for track_id, track_data in self.data.get("tracks", {}).items():
+            self._index_track(track_id, track_data)
+    
+    def _index_track(self, track_id: str, track_data: Dict[str, Any]):
+        """Add one track to the lookup tables"""
+        self._df = None
+        self._position[track_id] = len(self._position)
+        self._title_cf[track_id] = track_data.get("title", "").casefold()
+        
+        for genre in track_data.get("genres", []):
+            self._by_genre_cf.setdefault(genre.casefold(), set()).add(track_id)
+        
+        for artist in track_data.get("artists", []):
+            self._by_artist_cf.setdefault(artist.casefold(), set()).add(track_id)
+        
+        publish_date = track_data.get("publish_date") or ""
+        if publish_date:
+            self._by_year.setdefault(publish_date[:4], set()).add(track_id)
+    
+    def iter_tracks(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate (track_id, track_data) pairs, parsing them one at a time in streaming mode"""
+        if not self.streaming:
+            yield from self.data["tracks"].items()
+            return
+        
+        # The sidecar is small (it is compacted away), so it is read up front; tracks it
+        # replaces are skipped in the main file and yielded after it in their latest form
+        appended = self._read_sidecar()
+        if self.db_path.exists():
+            with open(self.db_path, 'rb') as f:
+                for track_id, track_data in ijson.kvitems(f, "tracks", use_float=True):
+                    if track_id not in appended:
+                        yield track_id, track_data
+        yield from appended.items()
+    
+    @staticmethod
+    def _track_matches(track_data: Dict[str, Any], matches: Callable[[str], bool], field: str) -> bool:
+        """Check a single track against the matcher without the lookup tables"""
+        if field in ("all", "title") and matches(track_data.get("title", "").casefold()):
+            return True
+        if field in ("all", "artist") and any(matches(a.casefold()) for a in track_data.get("artists", [])):
+            return True
+        if field in ("all", "genre") and any(matches(g.casefold()) for g in track_data.get("genres", [])):
+            return True
+        return False
+    
+    @staticmethod
+    def _match_index(index: Dict[str, Set[str]], matches: Callable[[str], bool]) -> Set[str]:
+        """Collect track IDs whose index key is accepted by the matcher"""
+        track_ids = set()
+        for key, key_track_ids in index.items():
+            if matches(key):
+                track_ids |= key_track_ids
+        return track_ids
+    
+    def _iter_ordered(self, track_ids) -> Iterator[SearchHit]:
+        """Yield search hits for track IDs in database order"""
+        for track_id in sorted(track_ids, key=self._position.__getitem__):
+            yield SearchHit(track_id, self.data["tracks"][track_id])
+    
+    @staticmethod
+    def _build_results(matches) -> List[Dict[str, Any]]:
+        """Merge track IDs into copies of their track data"""
+        return [dict(track_data, track_id=track_id) for track_id, track_data in matches]
+    
+    def search_tracks(self, query: Union[str, List[str]], field: str = "all") -> Iterator[SearchHit]:
         """
         Search tracks in database
         
+        Artist and genre matches are resolved against the lookup tables, so only
+        the distinct names are scanned rather than every track. Matches are
+        yielded as SearchHit(track_id, data) tuples referencing the stored data.
+        
         Args:
-            query: Search query
+            query: Search query, or a list of queries any of which may match
             field: Field to search in (title, artist, genre, all)
         """
-        results = []
-        query_lower = query.lower()
+        matches = _make_matcher([query] if isinstance(query, str) else query)
         
-        for track_id, track_data in self.data["tracks"].items():
-            match = False
-            
-            if field == "all" or field == "title":
-                if query_lower in track_data.get("title", "").lower():
-                    match = True
-            
-            if field == "all" or field == "artist":
-                artists = track_data.get("artists", [])
-                if any(query_lower in artist.lower() for artist in artists):
-                    match = True
-            
-            if field == "all" or field == "genre":
-                genres = track_data.get("genres", [])
-                if any(query_lower in genre.lower() for genre in genres):
-                    match = True
-            
-            if match:
-                result = track_data.copy()
-                result["track_id"] = track_id
-                results.append(result)
+        if self.streaming:
+            for track_id, track_data in self.iter_tracks():
+                if self._track_matches(track_data, matches, field):
+                    yield SearchHit(track_id, track_data)
+            return
+        
+        track_ids = set()
+        
+        if field == "all" or field == "title":
+            track_ids.update(
+                track_id for track_id, title_cf in self._title_cf.items()
+                if matches(title_cf)
+            )
         
-        return results
+        if field == "all" or field == "artist":
+            track_ids |= self._match_index(self._by_artist_cf, matches)
+        
+        if field == "all" or field == "genre":
+            track_ids |= self._match_index(self._by_genre_cf, matches)
+        
+        yield from self._iter_ordered(track_ids)
     
-    def get_tracks_by_genre(self, genre: str) -> List[Dict[str, Any]]:
-        """Get all tracks of a specific genre"""
-        return self.search_tracks(genre, "genre")
+    def get_tracks_by_genre(self, genre: Union[str, List[str]]) -> List[Dict[str, Any]]:
+        """Get all tracks of a specific genre (or of any of several genres)"""
+        return self._build_results(self.search_tracks(genre, "genre"))
     
-    def get_tracks_by_artist(self, artist: str) -> List[Dict[str, Any]]:
-        """Get all tracks by a specific artist"""
-        return self.search_tracks(artist, "artist")
+    def get_tracks_by_artist(self, artist: Union[str, List[str]]) -> List[Dict[str, Any]]:
+        """Get all tracks by a specific artist (or by any of several artists)"""
+        return self._build_results(self.search_tracks(artist, "artist"))
     
     def get_tracks_by_year(self, year: str) -> List[Dict[str, Any]]:
         """Get all tracks published in a specific year"""
-        results = []
-        
-        for track_id, track_data in self.data["tracks"].items():
-            publish_date = track_data.get("publish_date", "")
-            if publish_date.startswith(year):
-                result = track_data.copy()
-                result["track_id"] = track_id
-                results.append(result)
+        if self.streaming:
+            return self._build_results(
+                (track_id, track_data) for track_id, track_data in self.iter_tracks()
+                if (track_data.get("publish_date") or "").startswith(year)
+            )
+        
+        if len(year) <= 4:
+            track_ids = set()
+            for key, key_track_ids in self._by_year.items():
+                if key.startswith(year):
+                    track_ids |= key_track_ids
+        else:
+            # Full or partial dates are finer than the year index
+            track_ids = {
+                track_id for track_id, track_data in self.data["tracks"].items()
+                if (track_data.get("publish_date") or "").startswith(year)
+            }
         
-        return results
+        return self._build_results(self._iter_ordered(track_ids))
     
     def get_detailed_stats(self) -> Dict[str, Any]:
-        """Get comprehensive database statistics"""
-        tracks = self.data["tracks"]
+        """
+        Get comprehensive database statistics
         
-        if not tracks:
-            return {"error": "No tracks in database"}
+        Results are cached next to the database and reused while the database
+        file's modification time and track count are unchanged.
+        """
+        if not self.db_path.exists():
+            return self.compute_detailed_stats()
+        
+        cache_path = self.db_path.with_suffix(".stats.json")
+        db_stat = self.db_path.stat()
+        jsonl_mtime = self.jsonl_path.stat().st_mtime_ns if self.jsonl_path.exists() else 0
+        cache_key = [
+            db_stat.st_mtime_ns,
+            db_stat.st_size if self.streaming else len(self.data["tracks"]),
+            jsonl_mtime
+        ]
+        
+        if cache_path.exists():
+            try:
+                cached = load_json(cache_path)
+                if cached.get("key") == cache_key:
+                    return cached["stats"]
+            except Exception as e:
+                print(f"Ignoring unreadable stats cache: {e}")
         
-        # Basic counts
-        total_tracks = len(tracks)
-        
-        # File size analysis
-        file_sizes = [t.get("file_size", 0) for t in tracks.values()]
-        total_size = sum(file_sizes)
-        avg_size = total_size / len(file_sizes) if file_sizes else 0
-        
-        # Genre analysis
-        genre_counts = {}
-        for track_data in tracks.values():
-            for genre in track_data.get("genres", []):
-                genre_counts[genre] = genre_counts.get(genre, 0) + 1
-        
-        # Artist analysis
-        artist_counts = {}
-        for track_data in tracks.values():
-            for artist in track_data.get("artists", []):
-                artist_counts[artist] = artist_counts.get(artist, 0) + 1
-        
-        # Year analysis
-        year_counts = {}
-        for track_data in tracks.values():
+        stats = self.compute_detailed_stats()
+        try:
+            dump_json({"key": cache_key, "stats": stats}, cache_path, pretty=False)
+        except Exception as e:
+            print(f"Error saving stats cache: {e}")
+        return stats
+    
+    def dataframe(self) -> "pd.DataFrame":
+        """Return the loaded tracks as a DataFrame indexed by track ID, building it on first use"""
+        if self._df is None:
+            self._df = pd.DataFrame.from_dict(self.data["tracks"], orient="index")
+        return self._df
+    
+    def _aggregate_tracks(self):
+        """Aggregate totals and counters in a single pass over the tracks"""
+        total_tracks = 0
+        total_size = 0
+        genre_counts = Counter()
+        artist_counts = Counter()
+        year_counts = Counter()
+        download_date_counts = Counter()
+        
+        for _, track_data in self.iter_tracks():
+            total_tracks += 1
+            total_size += track_data.get("file_size") or 0
+            genre_counts.update(track_data.get("genres", ()))
+            artist_counts.update(track_data.get("artists", ()))
+            
             publish_date = track_data.get("publish_date", "")
             if publish_date:
-                year = publish_date[:4]
-                year_counts[year] = year_counts.get(year, 0) + 1
-        
-        # Download timeline
-        download_dates = []
-        for track_data in tracks.values():
+                year_counts[publish_date[:4]] += 1
+            
             download_timestamp = track_data.get("download_timestamp")
             if download_timestamp:
-                try:
-                    date = datetime.fromisoformat(download_timestamp.replace('Z', '+00:00'))
-                    download_dates.append(date.strftime('%Y-%m-%d'))
-                except:
-                    continue
+                date = _download_date(download_timestamp)
+                if date:
+                    download_date_counts[date] += 1
+        
+        return total_tracks, total_size, genre_counts, artist_counts, year_counts, download_date_counts
+    
+    def _aggregate_dataframe(self):
+        """Aggregate the same totals and counters with vectorized pandas operations"""
+        df = self.dataframe()
+        
+        def column(name: str) -> "pd.Series":
+            series = df[name].dropna() if name in df.columns else pd.Series(dtype=object)
+            return series.astype(object)
+        
+        def value_counts(series: "pd.Series") -> Counter:
+            return Counter({key: int(count) for key, count in series.value_counts().items()})
+        
+        total_size = int(pd.to_numeric(column("file_size"), errors="coerce").fillna(0).sum())
+        genre_counts = value_counts(column("genres").explode().dropna())
+        artist_counts = value_counts(column("artists").explode().dropna())
+        
+        publish_dates = column("publish_date")
+        year_counts = value_counts(publish_dates[publish_dates != ""].str.slice(0, 4))
+        
+        download_timestamps = column("download_timestamp")
+        download_timestamps = download_timestamps[download_timestamps != ""]
+        is_iso = download_timestamps.str.match(_ISO_DATE_PREFIX.pattern).fillna(False).astype(bool)
+        download_dates = pd.concat([
+            download_timestamps[is_iso].str.slice(0, 10),
+            download_timestamps[~is_iso].map(_download_date).dropna(),
+        ])
+        download_date_counts = value_counts(download_dates)
+        
+        return len(df), total_size, genre_counts, artist_counts, year_counts, download_date_counts
+    
+    def compute_detailed_stats(self) -> Dict[str, Any]:
+        """Compute comprehensive database statistics, vectorized with pandas when it is installed"""
+        if pd is not None and not self.streaming:
+            aggregates = self._aggregate_dataframe()
+        else:
+            aggregates = self._aggregate_tracks()
+        total_tracks, total_size, genre_counts, artist_counts, year_counts, download_date_counts = aggregates
+        
+        if not total_tracks:
+            return {"error": "No tracks in database"}
         
-        download_date_counts = {}
-        for date in download_dates:
-            download_date_counts[date] = download_date_counts.get(date, 0) + 1
+        avg_size = total_size / total_tracks
         
+        # Only JSON types (lists, not tuples), so a result read back from the stats cache is identical
         return {
             "total_tracks": total_tracks,
             "total_file_size_bytes": total_size,
@@ -147,15 +414,17 @@ class DatabaseManager:
             "average_file_size_mb": round(avg_size / (1024 * 1024), 2),
             "genres": {
                 "total_unique": len(genre_counts),
-                "counts": dict(sorted(genre_counts.items(), key=lambda x: x[1], reverse=True))
+                "counts": dict(genre_counts.most_common()),
+                "top": [[name, count] for name, count in genre_counts.most_common(10)]
             },
             "artists": {
                 "total_unique": len(artist_counts),
-                "counts": dict(sorted(artist_counts.items(), key=lambda x: x[1], reverse=True))
+                "counts": dict(artist_counts.most_common()),
+                "top": [[name, count] for name, count in artist_counts.most_common(10)]
             },
             "years": {
                 "total_unique": len(year_counts),
-                "counts": dict(sorted(year_counts.items(), key=lambda x: x[1], reverse=True))
+                "counts": dict(year_counts.most_common())
             },
             "download_timeline": dict(sorted(download_date_counts.items()))
         }
@@ -167,15 +436,18 @@ class DatabaseManager:
         if format_type == "m3u":
             playlist_path = self.db_path.parent / f"ncs_playlist_{timestamp}.m3u"
             
+            tracks_with_files = [track for track in tracks if track.get("file_path")]
+            exists = _paths_exist([track["file_path"] for track in tracks_with_files])
+            
+            lines = ["#EXTM3U\n"]
+            lines.extend(
+                f"#EXTINF:-1,{', '.join(track.get('artists', ['Unknown']))} - {track.get('title', 'Unknown')}\n"
+                f"{track['file_path']}\n"
+                for track, track_exists in zip(tracks_with_files, exists) if track_exists
+            )
+            
             with open(playlist_path, 'w', encoding='utf-8') as f:
-                f.write("#EXTM3U\n")
-                for track in tracks:
-                    file_path = track.get("file_path", "")
-                    if file_path and Path(file_path).exists():
-                        title = track.get("title", "Unknown")
-                        artists = ", ".join(track.get("artists", ["Unknown"]))
-                        f.write(f"#EXTINF:-1,{artists} - {title}\n")
-                        f.write(f"{file_path}\n")
+                f.write("".join(lines))
         
         elif format_type == "json":
             playlist_path = self.db_path.parent / f"ncs_playlist_{timestamp}.json"
@@ -186,8 +458,7 @@ class DatabaseManager:
                 "tracks": tracks
             }
             
-            with open(playlist_path, 'w', encoding='utf-8') as f:
-                json.dump(playlist_data, f, indent=2, ensure_ascii=False)
+            dump_json(playlist_data, playlist_path)
         
         print(f"Playlist exported to: {playlist_path}")
         return str(playlist_path)
@@ -197,15 +468,20 @@ class DatabaseManager:
         stats = {"total": 0, "missing_files": 0, "removed": 0}
         
         tracks_to_remove = []
+        tracks_with_files = []
         
         for track_id, track_data in self.data["tracks"].items():
             stats["total"] += 1
             file_path = track_data.get("file_path")
             
             if file_path:
-                if not Path(file_path).exists():
-                    stats["missing_files"] += 1
-                    tracks_to_remove.append(track_id)
+                tracks_with_files.append((track_id, file_path))
+        
+        file_paths = [file_path for _, file_path in tracks_with_files]
+        for (track_id, _), exists in zip(tracks_with_files, _paths_exist(file_paths)):
+            if not exists:
+                stats["missing_files"] += 1
+                tracks_to_remove.append(track_id)
         
         # Remove tracks with missing files
         for track_id in tracks_to_remove:
@@ -214,16 +490,29 @@ class DatabaseManager:
         
         # Save cleaned database
         if stats["removed"] > 0:
+            self.build_indices()
             self.save_database()
             print(f"Removed {stats['removed']} tracks with missing files")
         
         return stats
     
-    def save_database(self):
-        """Save database to file"""
+    def save_database(self, pretty: bool = False):
+        """
+        Save database to file
+        
+        The file is only read back by tooling, so it is written compactly unless
+        a human-readable dump is requested with pretty=True.
+        """
+        if self.streaming:
+            print("Cannot save a database opened in streaming mode")
+            return
+        
         try:
-            with open(self.db_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=4, ensure_ascii=False)
+            replace_json(self.data, self.db_path, pretty=pretty)
+            
+            # Appended tracks are now part of the main file
+            if self.jsonl_path.exists():
+                self.jsonl_path.unlink()
             print(f"Database saved to: {self.db_path}")
         except Exception as e:
             print(f"Error saving database: {e}")
@@ -252,7 +541,7 @@ class DatabaseManager:
         ]
         
         # Top 10 genres
-        for genre, count in list(stats["genres"]["counts"].items())[:10]:
+        for genre, count in stats["genres"]["top"]:
             report_lines.append(f"  {genre}: {count} tracks")
         
         report_lines.extend([
@@ -263,7 +552,7 @@ class DatabaseManager:
         ])
         
         # Top 10 artists
-        for artist, count in list(stats["artists"]["counts"].items())[:10]:
+        for artist, count in stats["artists"]["top"]:
             report_lines.append(f"  {artist}: {count} tracks")
         
         report_lines.extend([
@@ -296,11 +585,17 @@ class DatabaseManager:
         
         return report_content
 
+def _split_patterns(value: str) -> List[str]:
+    """Split a comma-separated CLI filter into its non-empty patterns"""
+    return [pattern.strip() for pattern in value.split(",") if pattern.strip()] or [value]
+
 def main():
     """Main CLI interface for database utilities"""
     parser = argparse.ArgumentParser(description="NCS Database Management Utilities")
     parser.add_argument("--db", default="ncs_downloads/tracks_database.json", 
                        help="Path to database file")
+    parser.add_argument("--streaming", action="store_true",
+                       help="Stream tracks from disk for search/stats/report instead of loading the whole database")
     
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
     
@@ -320,8 +615,8 @@ def main():
     
     # Playlist command
     playlist_parser = subparsers.add_parser("playlist", help="Create playlist")
-    playlist_parser.add_argument("--genre", help="Filter by genre")
-    playlist_parser.add_argument("--artist", help="Filter by artist")
+    playlist_parser.add_argument("--genre", help="Filter by genre (comma-separated for several)")
+    playlist_parser.add_argument("--artist", help="Filter by artist (comma-separated for several)")
     playlist_parser.add_argument("--year", help="Filter by year")
     playlist_parser.add_argument("--format", choices=["m3u", "json"], default="m3u",
                                 help="Playlist format")
@@ -329,6 +624,12 @@ def main():
     # Cleanup command
     subparsers.add_parser("cleanup", help="Clean up database (remove missing files)")
     
+    # Compact command
+    subparsers.add_parser("compact", help="Merge appended tracks into the database file")
+    
+    # Pretty-print command
+    subparsers.add_parser("pretty-print", help="Rewrite the database as indented, human-readable JSON")
+    
     # Report command
     report_parser = subparsers.add_parser("report", help="Generate comprehensive report")
     report_parser.add_argument("--output", help="Output file path")
@@ -340,51 +641,53 @@ def main():
         return
     
     # Initialize database manager
-    db_manager = DatabaseManager(args.db)
+    streaming = args.streaming and args.command in ("search", "stats", "report")
+    db_manager = DatabaseManager(args.db, streaming=streaming)
     
     if args.command == "search":
-        results = db_manager.search_tracks(args.query, args.field)
+        results = list(db_manager.search_tracks(args.query, args.field))
         print(f"Found {len(results)} tracks:")
-        for track in results[:20]:  # Limit to 20 results
-            artists = ", ".join(track.get("artists", []))
-            genres = ", ".join(track.get("genres", []))
-            print(f"  {track['track_id']}: {artists} - {track.get('title', 'Unknown')} [{genres}]")
+        for hit in results[:20]:  # Limit to 20 results
+            artists = ", ".join(hit.data.get("artists", []))
+            genres = ", ".join(hit.data.get("genres", []))
+            print(f"  {hit.track_id}: {artists} - {hit.data.get('title', 'Unknown')} [{genres}]")
     
     elif args.command == "stats":
         stats = db_manager.get_detailed_stats()
-        print(json.dumps(stats, indent=2))
+        print(format_json(stats))
     
     elif args.command == "export":
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         if args.format == "json":
             output_path = f"ncs_export_{timestamp}.json"
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(db_manager.data, f, indent=2, ensure_ascii=False)
+            dump_json(db_manager.data, Path(output_path))
         else:  # csv
             output_path = f"ncs_export_{timestamp}.csv"
-            with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            rows = (
+                (
+                    track_id,
+                    track_data.get('title', ''),
+                    '; '.join(track_data.get('artists', [])),
+                    '; '.join(track_data.get('genres', [])),
+                    track_data.get('url', ''),
+                    track_data.get('publish_date', ''),
+                    round((track_data.get('file_size') or 0) / (1024 * 1024), 2)
+                )
+                for track_id, track_data in db_manager.data["tracks"].items()
+            )
+            with open(output_path, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
                 writer = csv.writer(f)
                 writer.writerow(['Track ID', 'Title', 'Artists', 'Genres', 'URL', 'Publish Date', 'File Size (MB)'])
-                for track_id, track_data in db_manager.data["tracks"].items():
-                    file_size_mb = round(track_data.get('file_size', 0) / (1024 * 1024), 2)
-                    writer.writerow([
-                        track_id,
-                        track_data.get('title', ''),
-                        '; '.join(track_data.get('artists', [])),
-                        '; '.join(track_data.get('genres', [])),
-                        track_data.get('url', ''),
-                        track_data.get('publish_date', ''),
-                        file_size_mb
-                    ])
+                writer.writerows(rows)
         print(f"Database exported to: {output_path}")
     
     elif args.command == "playlist":
         tracks = []
         
         if args.genre:
-            tracks = db_manager.get_tracks_by_genre(args.genre)
+            tracks = db_manager.get_tracks_by_genre(_split_patterns(args.genre))
         elif args.artist:
-            tracks = db_manager.get_tracks_by_artist(args.artist)
+            tracks = db_manager.get_tracks_by_artist(_split_patterns(args.artist))
         elif args.year:
             tracks = db_manager.get_tracks_by_year(args.year)
         else:
@@ -404,6 +707,12 @@ def main():
         print(f"  Missing files: {stats['missing_files']}")
         print(f"  Removed: {stats['removed']}")
     
+    elif args.command == "compact":
+        db_manager.compact()
+    
+    elif args.command == "pretty-print":
+        db_manager.save_database(pretty=True)
+    
     elif args.command == "report":
         report = db_manager.generate_report(args.output)
         if not args.output:
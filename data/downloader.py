@@ -1,19 +1,47 @@
+import asyncio
+import functools
+import glob
 import json
 import os
+import queue
 import time
-import tqdm
 from bs4 import BeautifulSoup
 import requests
+import httpx
 from itertools import islice
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
+from selectolax.parser import HTMLParser
+
+try:
+    from .rate_limit import TokenBucket
+except ImportError:
+    from rate_limit import TokenBucket
 
 #テスト用　本番はipynbで実行すること
 url_test = "https://takuto-sugawara.github.io/scraping_test/"
 url = "https://ncs.io/"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+@functools.lru_cache(maxsize=1)
+def get_driver_path():
+    #ChromeDriverManager().install()は毎回ネットワークで新しいバージョンを確認するので、手元にあるドライバーを優先する
+    env_path = os.environ.get("CHROMEDRIVER_PATH", "")
+    if env_path and os.path.isfile(env_path):
+        return env_path
+
+    cached = [
+        path for path in glob.glob(os.path.expanduser("~/.wdm/drivers/chromedriver/**/chromedriver*"), recursive=True)
+        if os.path.isfile(path) and os.path.basename(path) in ("chromedriver", "chromedriver.exe")
+    ]
+    if cached:
+        return max(cached, key=os.path.getmtime)
+
+    return ChromeDriverManager().install()
 
 class CheckpointManager:
 
@@ -22,83 +50,145 @@ class CheckpointManager:
         
 class NCSDownloader:
 
-    def __init__(self, url, tracks_data="tracks_data.json", page_limit=1, track_limit=5, headless=False):
+    def __init__(self, url, tracks_data="tracks_data.json", page_limit=1, track_limit=5, headless=False, pool_size=4, rate_limit=6, rate_period=60):
         self.url = url
-        self.track_links = [] # ダウンロードリンクを格納するリスト
+        self.track_links = {} # ダウンロードリンクを格納する辞書　URLをキーにして重複を防ぐ
         self.tracks_database = tracks_data #曲の情報を管理するjsonファイル
         self.load_database()
         self.page_limit = page_limit
         self.track_limit = track_limit
+        self.downloaded_files = []
+        self.pool_size = pool_size
+        self._driver_pool = queue.Queue() # ダウンロード用のドライバー　1スレッドにつき1つ使う
+        self.limiter = TokenBucket(rate_limit, rate_period) # rate_period秒あたりrate_limit曲まで
+
+        self.service = Service(get_driver_path())
+        self.driver = webdriver.Chrome(service=self.service, options=self.make_options(headless))
 
+    def make_options(self, headless):
         options = Options()
         options.add_experimental_option("prefs", {
             "download.default_directory":os.getcwd()+"/data/downloads"
         })# ダウンロード先のディレクトリを指定 ipynbで実行することを想定している
         if headless:
             options.add_argument("--headless") # Run headless Chrome
-
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
+        return options
+
+    def start_driver_pool(self):
+        #メインのドライバーのクッキーを各ドライバーにコピーしておく
+        cookies = self.driver.get_cookies()
+        while self._driver_pool.qsize() < self.pool_size:
+            driver = webdriver.Chrome(service=self.service, options=self.make_options(True))
+            driver.get(self.url)
+            for cookie in cookies:
+                driver.add_cookie(cookie)
+            self._driver_pool.put(driver)
 
     def load_database(self):
-        pass #あとでやる
+        #チェックポイントファイルからダウンロード済みのURLを読み込む
+        self._seen = set()
+        if os.path.exists(self.tracks_database):
+            with open(self.tracks_database, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            self._seen = set(checkpoint.get("urls", []))
+
+    def save_database(self):
+        with open(self.tracks_database, 'w', encoding='utf-8') as f:
+            json.dump({"urls": sorted(self._seen)}, f, indent=4, ensure_ascii=False)
  
     def enter(self):
         self.driver.get(self.url)
         print("Successfully entered URL:", self.url)
         time.sleep(1) #念のため
 
-    def search_download_links(self):
+    def page_url(self, page):
+        #2ページ目以降は ?page=N で取得できる前提（未確認）。違う場合は page_limit=1 のまま使うこと
+        return self.url if page == 1 else urljoin(self.url, f"?page={page}")
+
+    def parse_listing(self, html):
         #ちょいちょいサイトの構造が変わるので都度変更
+        tree = HTMLParser(html)
+        items = tree.css("main .container-fluid .row .col-lg-2.item")
+
+        links = []
+        for item in islice(items, self.track_limit):
+            link = item.css_first("a")
+            if link is None:
+                continue
+
+            #ジャンルが複数ある場合はカンマ区切りで書かれている
+            genres = item.css_first(".options .row.align-items-center .col-6.col-lg-6 span strong")
+            genres = [genre.strip() for genre in genres.text().split(",")] if genres else []
+
+            links.append({
+                "url": urljoin(self.url, link.attributes.get("href") or ""),
+                "genres": genres,
+            })
+        return links
+
+    def render_page(self, page_url):
+        self.driver.get(page_url)
+        return self.driver.page_source
+
+    async def search_download_links(self):
         """
         return links = [{url:str, title:str, artists:list[str]}, ...]
         information about genres is included in links
         it will be get from the track page in download_file method
         """
 
-        for _ in range(self.page_limit): #1ページ内の曲詳細ページのリンク、アーティスト名、曲名、ジャンルを含むクラスを取得
-            print("Searching for download links...")
-            body = self.driver.find_element(By.TAG_NAME, "body")
-            main = body.find_element(By.TAG_NAME, "main")
-            module = main.find_element(By.CLASS_NAME, "module artists")
-            container_fluid = main.find_element(By.CLASS_NAME, "container-fluid")
-            row = container_fluid.find_element(By.CLASS_NAME, "row")
-            items = row.find_elements(By.CLASS_NAME, "col-lg-2 item")
-
-            for item in islice(items, self.track_limit):
-                link = item.find_element(By.TAG_NAME, "a")
-                
-                #ジャンルが複数ある場合はカンマ区切りで書かれている
-                genres = item.find_element(By.CLASS_NAME, "options").find_element(By.CLASS_NAME, "row align-items-center")
-                genres = genres.find_element(By.CLASS_NAME, "col-6 col-lg-6").find_element(By.TAG_NAME, "span")
-                genres = genres.find_elements(By.TAG_NAME, "strong").text
-
-                
-                
-
-
-
-
-
-        return
-        #チェックポイントファイルを参照して、重複しているリンクはdownload_linksに追加しない
+        #一覧ページは静的なHTMLなのでブラウザを使わずにまとめて取得する
+        print("Searching for download links...")
+        page_urls = [self.page_url(page) for page in range(1, self.page_limit + 1)]
+        async with httpx.AsyncClient(headers={"User-Agent": USER_AGENT}, follow_redirects=True) as client:
+            responses = await asyncio.gather(*[client.get(page_url) for page_url in page_urls], return_exceptions=True)
+
+        for page_url, response in zip(page_urls, responses):
+            links = []
+            if not isinstance(response, Exception) and response.status_code == 200:
+                links = self.parse_listing(response.text)
+            if not links:
+                #曲が見つからない場合はJSで描画されるページとみなしてSeleniumで取得する
+                #driver.getはブロックするのでイベントループを止めないよう別スレッドで実行する
+                links = self.parse_listing(await asyncio.to_thread(self.render_page, page_url))
+
+            #チェックポイントファイルを参照して、重複しているリンクはtrack_linksに追加しない
+            for link in links:
+                if link["url"] in self._seen:
+                    continue
+                self.track_links.setdefault(link["url"], link)
+
+        return self.track_links
 
     def download_files(self):
-        for i in range(len(self.track_links)):
-            download = self.download_file(self.track_links[i])
-            self.downloaded_files.append(download)
-            print(f"Downloaded file {i+1}/{self.limit}: {download}")
-            print("waiting for 10 seconds before next download...")
-            time.sleep(10)
-
-    def download_file(self, link):
-
-        pass
+        self.start_driver_pool()
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            for i, download in enumerate(executor.map(self.fetch_one, self.track_links.values())):
+                self.downloaded_files.append(download)
+                print(f"Downloaded file {i+1}/{len(self.track_links)}: {download}")
+        self.save_database()
+
+    def fetch_one(self, link):
+        self.limiter.acquire()
+        driver = self._driver_pool.get()
+        try:
+            download = self.download_file(link, driver)
+            #ダウンロードに成功した曲だけをチェックポイントに記録する（失敗した曲は次回再試行する）
+            if download:
+                self._seen.add(link["url"])
+            return download
+        finally:
+            self._driver_pool.put(driver)
+
+    def download_file(self, link, driver=None):
+        driver = driver or self.driver
         #　return download_file = {[title, genres, artists]}
         # download_file
 
 
     def quit(self):
+        while not self._driver_pool.empty():
+            self._driver_pool.get().quit()
         self.driver.quit()
         print("Driver closed.")
 
@@ -1,22 +1,51 @@
 import os
 import time
+import shutil
+import threading
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
+import functools
+import hashlib
 from urllib.parse import urljoin, urlparse
 from pathlib import Path
 import logging
 from typing import List, Dict, Optional, Set
-from dataclasses import dataclass, asdict
+from collections import defaultdict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime, date
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 from bs4 import BeautifulSoup
 
+try:
+    from .json_io import load_json, dump_json, replace_json, format_json, dumps_line, read_appended
+except ImportError:
+    from json_io import load_json, dump_json, replace_json, format_json, dumps_line, read_appended
+
+try:
+    from .rate_limit import TokenBucket
+except ImportError:
+    from rate_limit import TokenBucket
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import lxml  # noqa: F401 - only needed as a BeautifulSoup backend
+    _HTML_PARSER = 'lxml'
+except ImportError:
+    _HTML_PARSER = 'html.parser'
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,33 +57,227 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Patterns used while parsing track pages, compiled once
+_NON_ALNUM = re.compile(r'[^a-zA-Z0-9]+')
+_BRACKETS = re.compile(r'\[.*?\]')
+_BY_PREFIX = re.compile(r'^(by|artist:?)\s*', re.IGNORECASE)
+_ARTIST_STOP = frozenset({'the', 'a', 'an'})
+_ARTIST_SPLIT = re.compile(r'\s+feat\.\s+|\s+ft\.\s+|\s+&\s+|\s+and\s+|,|\s+[xX]\s+', re.IGNORECASE)
+_GENRE_SPLIT = re.compile(r'\s*[,;&|]\s*')
+_YEAR = re.compile(r'20\d{2}')
+_FILENAME_WS = re.compile(r'[_\s]+')
+_FN_TRANS = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
+# Common electronic music genres
+KNOWN_GENRES = (
+    'House', 'Progressive House', 'Deep House', 'Tech House',
+    'Dubstep', 'Drum & Bass', 'DnB', 'Trap', 'Future Bass',
+    'Electro', 'Electronic', 'EDM', 'Ambient', 'Chill',
+    'Synthwave', 'Melodic Dubstep', 'Hardstyle', 'Trance'
+)
+# Longest names first so "Progressive House" wins over "House" in one scan
+_GENRE_RE = re.compile('|'.join(re.escape(g) for g in sorted(KNOWN_GENRES, key=len, reverse=True)), re.IGNORECASE)
+_GENRE_CANON = {g.lower(): g for g in KNOWN_GENRES}
+
+# Selectors used by extract_track_metadata, resolved in one pass over the page
+_TAG_SELECTORS = frozenset(('h1', 'h2', 'h3', 'time', 'title', 'p'))
+_CLASS_SELECTORS = tuple(
+    (part, f'[class*="{part}"]')
+    for part in ('title', 'track', 'artist', 'by', 'genre', 'tag', 'category', 'date', 'published', 'credit', 'attribution')
+)
+_META_SELECTORS = {
+    ('property', 'og:title'): 'meta[property="og:title"]',
+    ('name', 'author'): 'meta[name="author"]',
+    ('name', 'keywords'): 'meta[name="keywords"]',
+    ('property', 'article:published_time'): 'meta[property="article:published_time"]',
+}
+
+# Links that point at the track's audio file, in order of preference
+_DOWNLOAD_SELECTORS = (
+    "a[href*='.mp3']",
+    "a[download]",
+    "*[class*='download'] a",
+    "button[onclick*='download']",
+    "a[href*='download']"
+)
+
+_AUDIO_EXTS = ('.mp3', '.wav', '.flac', '.m4a')
+
+# Common date formats, tried against the part before any 'T' time suffix
+_DATE_FORMATS = (
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%m/%d/%Y',
+    '%B %d, %Y',
+    '%d %B %Y'
+)
+
+_SYNC_MODES = ('off', 'interval', 'always')
+
+# Databases larger than this are streamed with ijson rather than parsed in one go
+_STREAM_LOAD_THRESHOLD = 10 * 1024 * 1024
+
+
+def _collect_elements(soup: BeautifulSoup) -> Dict[str, list]:
+    """Walk the page once and group elements by the metadata selectors they match, in document order"""
+    found = defaultdict(list)
+    for element in soup.find_all(True):
+        name = element.name
+        if name in _TAG_SELECTORS:
+            found[name].append(element)
+        elif name == 'meta':
+            for attr in ('property', 'name'):
+                selector = _META_SELECTORS.get((attr, element.get(attr)))
+                if selector:
+                    found[selector].append(element)
+        
+        classes = element.get('class')
+        if classes:
+            class_str = ' '.join(classes)
+            for part, selector in _CLASS_SELECTORS:
+                if part in class_str:
+                    found[selector].append(element)
+    return found
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_cached(date_str: str) -> Optional[str]:
+    """Parse date string to YYYY-MM-DD format; pages repeat the same strings, so results are memoized"""
+    day = date_str.split('T')[0]
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(day, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    
+    # Try to extract year at least
+    year_match = _YEAR.search(date_str)
+    if year_match:
+        return f"{year_match.group()}-01-01"
+    
+    return None
+
+
+@functools.lru_cache(maxsize=8192)
+def _sanitize_filename_cached(filename: str) -> str:
+    """Sanitize filename for safe file system usage; retries and resumes ask for the same names again"""
+    filename = filename.translate(_FN_TRANS)
+    filename = _FILENAME_WS.sub('_', filename)
+    
+    if len(filename) > 200:
+        name, ext = os.path.splitext(filename)
+        filename = name[:200-len(ext)] + ext
+    
+    return filename
+
+
+@dataclass(slots=True)
 class Track:
     """Enhanced data class for track information"""
     title: str
     artists: List[str]
     genres: List[str]
     url: Optional[str] = None
+    download_url: Optional[str] = None
     publish_date: Optional[str] = None
     credit_info: Optional[str] = None
     file_size: Optional[int] = None
     file_path: Optional[str] = None
     track_id: Optional[str] = None
+    
+    def to_dict(self) -> Dict:
+        """Shallow dict of the fields; cheaper than asdict's recursive copy for this flat record"""
+        return {
+            "title": self.title,
+            "artists": list(self.artists),
+            "genres": list(self.genres),
+            "url": self.url,
+            "download_url": self.download_url,
+            "publish_date": self.publish_date,
+            "credit_info": self.credit_info,
+            "file_size": self.file_size,
+            "file_path": self.file_path,
+            "track_id": self.track_id
+        }
+
+class MetadataCache:
+    """On-disk cache of extracted track metadata, one JSON file per track URL"""
+    
+    def __init__(self, cache_dir: Path, ttl: float = 7 * 24 * 3600):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+    
+    def _path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.blake2b(url.encode('utf-8'), digest_size=12).hexdigest()}.json"
+    
+    def get(self, url: str) -> Optional[Dict]:
+        """Return the cached metadata for url, or None if missing, expired or unreadable"""
+        path = self._path(url)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                return None
+            return load_json(path)
+        except (OSError, ValueError):
+            return None
+    
+    def put(self, url: str, metadata: Dict):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            dump_json(metadata, self._path(url), pretty=False)
+        except OSError as e:
+            logger.warning(f"Could not cache metadata for {url}: {e}")
+    
+    def discard(self, url: str):
+        """Drop the cached metadata for url, if any"""
+        try:
+            self._path(url).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove cached metadata for {url}: {e}")
 
 class TrackDatabase:
     """Manages track information in JSON format"""
     
-    def __init__(self, db_path: str = "tracks_database.json"):
+    def __init__(self, db_path: str = "tracks_database.json", save_delay: float = 0.5,
+                 max_pending_writes: int = 1000, sync_mode: str = "interval",
+                 sync_interval: float = 5.0):
+        """
+        Args:
+            db_path: Path to the JSON database
+            save_delay: Seconds to wait for further changes before a full save
+            max_pending_writes: Changes after which a save happens immediately
+            sync_mode: When writes are fsynced to disk: 'off' leaves it to the OS,
+                'interval' syncs at most once every sync_interval seconds and
+                'always' syncs every write
+            sync_interval: Seconds between fsyncs in 'interval' mode
+        """
+        if sync_mode not in _SYNC_MODES:
+            raise ValueError(f"sync_mode must be one of {', '.join(_SYNC_MODES)}, got {sync_mode!r}")
         self.db_path = Path(db_path)
+        self.jsonl_path = self.db_path.with_suffix('.jsonl')
         self.data = {"tracks": {}}
+        self.save_delay = save_delay
+        self.max_pending_writes = max_pending_writes
+        self._lock = threading.RLock()  # Downloads add tracks from worker threads
+        self._jsonl = None
+        self._jsonl_lines = 0
+        self._backed_up = False
+        self._flush_timer = None
+        self._pending_writes = 0
+        self.sync_mode = sync_mode
+        self.sync_interval = sync_interval
+        self._last_fsync = 0.0
         self.load_database()
     
     def load_database(self):
         """Load existing database from file"""
         if self.db_path.exists():
             try:
-                with open(self.db_path, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
+                if ijson is not None and self.db_path.stat().st_size > _STREAM_LOAD_THRESHOLD:
+                    self.data = {"tracks": self._stream_tracks()}
+                else:
+                    self.data = load_json(self.db_path)
                     
                 # Ensure proper structure
                 if "tracks" not in self.data:
@@ -66,18 +289,157 @@ class TrackDatabase:
                 self.data = {"tracks": {}}
         else:
             logger.info("Creating new track database")
+        
+        self.replay_appended_tracks()
+        self.build_index()
+    
+    def _stream_tracks(self) -> Dict[str, Dict]:
+        """Read tracks one at a time so large databases never hold a full parse tree in memory"""
+        tracks = {}
+        with open(self.db_path, 'rb') as f:
+            for track_id, track_data in ijson.kvitems(f, 'tracks', use_float=True):
+                tracks[track_id] = track_data
+        return tracks
+    
+    def replay_appended_tracks(self):
+        """Merge tracks appended to the JSONL sidecar since the database was last saved"""
+        appended, lines, skipped = read_appended(self.jsonl_path)
+        self.data["tracks"].update(appended)
+        
+        self._jsonl_lines = lines
+        if skipped:
+            logger.warning(f"Skipped {skipped} unreadable lines in {self.jsonl_path}")
+        if appended:
+            logger.info(f"Replayed {len(appended)} appended tracks from {self.jsonl_path}")
+    
+    def _write_lines(self, lines: List[bytes]):
+        if self._jsonl is None:
+            self._jsonl = open(self.jsonl_path, 'ab')
+        self._jsonl.write(b''.join(lines))
+        self._jsonl.flush()
+        self._maybe_fsync(self._jsonl)
+        
+        # Updates append superseded copies of a track; fold them away once they dominate
+        self._jsonl_lines += len(lines)
+        if self._jsonl_lines > 2 * len(self.data["tracks"]):
+            self.compact()
+    
+    def _maybe_fsync(self, f):
+        """Force a flushed file to disk according to sync_mode"""
+        if self.sync_mode == "off":
+            return
+        now = time.monotonic()
+        if self.sync_mode == "interval" and now - self._last_fsync < self.sync_interval:
+            return
+        os.fsync(f.fileno())
+        self._last_fsync = now
+    
+    def _append(self, track_id: str, track_data: Dict):
+        """Append one track to the JSONL sidecar so it survives a crash before the next save"""
+        self._write_lines([dumps_line({"id": track_id, **track_data})])
+    
+    def build_index(self):
+        """Index track IDs by (lowercased title, url) and rebuild the running stats"""
+        # Lowercased titles live beside the data rather than in it, so they are never saved
+        self._title_lower = {tid: td["title"].lower() for tid, td in self.data["tracks"].items()}
+        self._index = {(self._title_lower[tid], td.get("url")): tid for tid, td in self.data["tracks"].items()}
+        
+        # Inverted indices from genre/artist name to the IDs of its tracks
+        self._by_genre: Dict[str, Set[str]] = {}
+        self._by_artist: Dict[str, Set[str]] = {}
+        self._total_size = 0
+        self._latest_download = ""
+        for track_id, track_data in self.data["tracks"].items():
+            self._index_track(track_id, track_data)
     
-    def save_database(self):
-        """Save database to file"""
+    def _index_track(self, track_id: str, track_data: Dict):
+        """Add a track to the genre/artist indices and the running totals"""
+        for name in track_data.get("genres", ()):
+            self._by_genre.setdefault(name, set()).add(track_id)
+        for name in track_data.get("artists", ()):
+            self._by_artist.setdefault(name, set()).add(track_id)
+        self._total_size += track_data.get("file_size") or 0
+        if self._latest_download is not None:
+            self._latest_download = max(self._latest_download, track_data.get("download_timestamp", ""))
+    
+    def _unindex_track(self, track_id: str, track_data: Dict):
+        """Remove a track from the genre/artist indices and the running totals"""
+        for index, key in ((self._by_genre, "genres"), (self._by_artist, "artists")):
+            for name in track_data.get(key, ()):
+                track_ids = index.get(name)
+                if track_ids is not None:
+                    track_ids.discard(track_id)
+                    if not track_ids:
+                        del index[name]
+        self._total_size -= track_data.get("file_size") or 0
+        if track_data.get("download_timestamp", "") == self._latest_download:
+            self._latest_download = None  # Recomputed on the next get_stats
+    
+    def save_database(self, force: bool = False):
+        """
+        Save database to file
+        
+        Saves are debounced: repeated calls within save_delay seconds are coalesced
+        into a single write, or written at once after max_pending_writes requests.
+        Tracks added in the meantime are already safe in the JSONL sidecar.
+        Pass force=True to write immediately, e.g. on shutdown.
+        """
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            
+            self._pending_writes += 1
+            if force or self._pending_writes >= self.max_pending_writes:
+                self._save_database()
+                return
+            
+            self._flush_timer = threading.Timer(self.save_delay, self._flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def _flush(self):
+        with self._lock:
+            self._flush_timer = None
+            self._save_database()
+    
+    def compact(self):
+        """Merge the JSONL sidecar into the database file"""
+        if self._jsonl_lines or self.jsonl_path.exists():
+            self.save_database(force=True)
+    
+    def close(self):
+        """Write any pending debounced save and release the sidecar handle"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self.save_database(force=True)
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+    
+    def _save_database(self):
+        self._pending_writes = 0
         try:
-            # Create backup
-            if self.db_path.exists():
-                backup_path = self.db_path.with_suffix('.backup.json')
-                self.db_path.rename(backup_path)
-            
-            # Save current data
-            with open(self.db_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=4, ensure_ascii=False)
+            # Keep a copy of the file as it was before this session's first save
+            if not self._backed_up and self.db_path.exists():
+                shutil.copy2(self.db_path, self.db_path.with_suffix('.backup.json'))
+            self._backed_up = True
+            
+            # Only tooling reads this file, so it is written compactly; exports stay indented.
+            # A full save always syncs unless sync_mode is off, since the sidecar holding
+            # these tracks is removed next
+            fsync = self.sync_mode != "off"
+            replace_json(self.data, self.db_path, pretty=False, fsync=fsync)
+            if fsync:
+                self._last_fsync = time.monotonic()
+            
+            # Appended tracks are now part of the main file
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+            if self.jsonl_path.exists():
+                self.jsonl_path.unlink()
+            self._jsonl_lines = 0
                 
             logger.info(f"Database saved with {len(self.data['tracks'])} tracks")
         except Exception as e:
@@ -86,8 +448,7 @@ class TrackDatabase:
     def generate_track_id(self, track: Track) -> str:
         """Generate unique track ID"""
         # Create base ID from title
-        base_id = re.sub(r'[^a-zA-Z0-9]', '_', track.title.lower())
-        base_id = re.sub(r'_+', '_', base_id).strip('_')
+        base_id = _NON_ALNUM.sub('_', track.title.lower()).strip('_')
         
         # Ensure uniqueness
         track_id = base_id
@@ -100,93 +461,129 @@ class TrackDatabase:
     
     def add_track(self, track: Track) -> str:
         """Add track to database and return track ID"""
+        with self._lock:
+            return self._add_track(track)
+    
+    def _add_track(self, track: Track) -> str:
+        track_id = self._insert_track(track)
+        self._append(track_id, self.data["tracks"][track_id])
+        logger.info(f"Added track to database: {track_id}")
+        return track_id
+    
+    @staticmethod
+    def _record_fields(track: Track) -> Dict:
+        """The stored fields of a track; its ID is the record's key rather than a field"""
+        track_data = track.to_dict()
+        del track_data["track_id"]
+        return track_data
+    
+    def _insert_track(self, track: Track) -> str:
+        """Store a track in memory and in the lookup structures, without persisting it"""
         track_id = self.generate_track_id(track)
         track.track_id = track_id
         
-        track_data = {
-            "title": track.title,
-            "genres": track.genres,
-            "artists": track.artists,
-            "url": track.url,
-            "publish_date": track.publish_date,
-            "credit_info": track.credit_info,
-            "file_path": track.file_path,
-            "file_size": track.file_size,
-            "download_timestamp": datetime.now().isoformat(),
-            "last_updated": datetime.now().isoformat()
-        }
+        track_data = self._record_fields(track)
+        track_data["download_timestamp"] = track_data["last_updated"] = datetime.now().isoformat()
         
         self.data["tracks"][track_id] = track_data
-        logger.info(f"Added track to database: {track_id}")
+        title_lower = self._title_lower[track_id] = track.title.lower()
+        self._index[(title_lower, track.url)] = track_id
+        self._index_track(track_id, track_data)
         return track_id
     
+    def add_tracks(self, tracks: List[Track]) -> List[str]:
+        """
+        Add several tracks under one lock and append them to the sidecar in one write
+        
+        Tracks already in the database are not added again; their existing ID is returned.
+        """
+        with self._lock:
+            track_ids = []
+            lines = []
+            for track in tracks:
+                track_id = self.track_exists(track)
+                if track_id is None:
+                    track_id = self._insert_track(track)
+                    lines.append(dumps_line({"id": track_id, **self.data["tracks"][track_id]}))
+                track_ids.append(track_id)
+            
+            if lines:
+                self._write_lines(lines)
+                logger.info(f"Added {len(lines)} tracks to database")
+            return track_ids
+    
     def update_track(self, track_id: str, track: Track):
         """Update existing track in database"""
+        with self._lock:
+            self._update_track(track_id, track)
+    
+    def _update_track(self, track_id: str, track: Track):
         if track_id in self.data["tracks"]:
-            self.data["tracks"][track_id].update({
-                "title": track.title,
-                "genres": track.genres,
-                "artists": track.artists,
-                "url": track.url,
-                "publish_date": track.publish_date,
-                "credit_info": track.credit_info,
-                "file_path": track.file_path,
-                "file_size": track.file_size,
-                "last_updated": datetime.now().isoformat()
-            })
+            old = self.data["tracks"][track_id]
+            self._index.pop((self._title_lower[track_id], old.get("url")), None)
+            title_lower = self._title_lower[track_id] = track.title.lower()
+            self._index[(title_lower, track.url)] = track_id
+            self._unindex_track(track_id, old)
+            old.update(self._record_fields(track), last_updated=datetime.now().isoformat())
+            self._index_track(track_id, old)
+            self._append(track_id, old)
             logger.info(f"Updated track in database: {track_id}")
     
+    def remove_track(self, track_id: str) -> bool:
+        """Remove a track from the database; returns False if it was not stored"""
+        with self._lock:
+            track_data = self.data["tracks"].pop(track_id, None)
+            if track_data is None:
+                return False
+            
+            self._index.pop((self._title_lower.pop(track_id), track_data.get("url")), None)
+            self._unindex_track(track_id, track_data)
+            # The sidecar only records additions, so write the removal out at once
+            self.save_database(force=True)
+            logger.info(f"Removed track from database: {track_id}")
+            return True
+    
     def track_exists(self, track: Track) -> Optional[str]:
         """Check if track already exists in database"""
-        for track_id, track_data in self.data["tracks"].items():
-            if (track_data["title"].lower() == track.title.lower() and 
-                track_data.get("original_url") == track.url):
-                return track_id
-        return None
+        return self._index.get((track.title.lower(), track.url))
     
     def get_stats(self) -> Dict[str, any]:
-        """Get database statistics"""
-        tracks = self.data["tracks"]
-        
-        # Count by genre
-        genre_counts = {}
-        for track_data in tracks.values():
-            for genre in track_data.get("genres", []):
-                genre_counts[genre] = genre_counts.get(genre, 0) + 1
-        
-        # Count by artist
-        artist_counts = {}
-        for track_data in tracks.values():
-            for artist in track_data.get("artists", []):
-                artist_counts[artist] = artist_counts.get(artist, 0) + 1
-        
-        # Calculate total file size
-        total_size = sum(track_data.get("file_size", 0) for track_data in tracks.values())
-        
-        return {
-            "total_tracks": len(tracks),
-            "total_file_size": total_size,
-            "total_file_size_mb": round(total_size / (1024 * 1024), 2),
-            "genres": dict(sorted(genre_counts.items(), key=lambda x: x[1], reverse=True)),
-            "artists": dict(sorted(artist_counts.items(), key=lambda x: x[1], reverse=True)),
-            "most_recent_download": max([t.get("download_timestamp", "") for t in tracks.values()] or [""])
-        }
+        """Get database statistics from the indices kept up to date by add/update/remove"""
+        with self._lock:
+            tracks = self.data["tracks"]
+            if self._latest_download is None:
+                self._latest_download = max((t.get("download_timestamp", "") for t in tracks.values()), default="")
+            
+            return {
+                "total_tracks": len(tracks),
+                "total_file_size": self._total_size,
+                "total_file_size_mb": round(self._total_size / (1024 * 1024), 2),
+                "genres": {g: len(ids) for g, ids in sorted(self._by_genre.items(), key=lambda kv: len(kv[1]), reverse=True)},
+                "artists": {a: len(ids) for a, ids in sorted(self._by_artist.items(), key=lambda kv: len(kv[1]), reverse=True)},
+                "most_recent_download": self._latest_download
+            }
 
 class EnhancedNCSDownloader:
     """Enhanced NCS downloader with JSON track management"""
     
-    def __init__(self, download_dir: str = "data/downloads", delay: float = 10.0, dry_run: bool = False):
+    def __init__(self, download_dir: str = "data/downloads", delay: float = 10.0, dry_run: bool = False,
+                 max_concurrent: int = 4):
         """Initialize the enhanced NCS downloader"""
         self.base_url = "https://ncs.io"
         self.download_dir = Path(download_dir)
         self.delay = delay
         self.dry_run = dry_run
+        self.max_concurrent = max_concurrent
         self.driver = None
+        self._driver_lock = threading.Lock()
+        # Average one request per `delay` seconds, with bursts of up to 4 for the worker pools
+        self.limiter = TokenBucket(rate=4, period=4 * delay) if delay > 0 else None
         self.session = requests.Session()
         self.discovered_urls: Set[str] = set()
         
-        # Initialize track database
+        # Initialize track database and metadata cache
         self.db = TrackDatabase(self.download_dir / "tracks_database.json")
+        self.metadata_cache = MetadataCache(self.download_dir / ".meta_cache")
         
         # Create download directory
         if not self.dry_run:
@@ -197,6 +594,13 @@ class EnhancedNCSDownloader:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         })
         
+        # Keep connections to ncs.io alive and back off on 429/5xx (honours Retry-After).
+        # Every download worker needs its own pooled connection, or urllib3 opens and drops extras.
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(16, self.max_concurrent), max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
         logger.info(f"Enhanced NCS Downloader initialized. Download directory: {self.download_dir}")
         if self.dry_run:
             logger.info("Running in DRY RUN mode - no files will be downloaded")
@@ -228,6 +632,11 @@ class EnhancedNCSDownloader:
             genres=[],
             url=url
         )
+        found = _collect_elements(soup)
+        
+        def first(selector):
+            elements = found.get(selector)
+            return elements[0] if elements else None
         
         # Extract title
         title_selectors = [
@@ -240,16 +649,16 @@ class EnhancedNCSDownloader:
         
         for selector in title_selectors:
             if selector.startswith('meta'):
-                element = soup.select_one(selector)
+                element = first(selector)
                 if element and element.get('content'):
                     track.title = element.get('content').strip()
                     break
             else:
-                element = soup.select_one(selector)
+                element = first(selector)
                 if element and element.get_text(strip=True):
                     title = element.get_text(strip=True)
                     # Clean title from common patterns
-                    title = re.sub(r'\[.*?\]', '', title).strip()
+                    title = _BRACKETS.sub('', title).strip()
                     if title and len(title) > 3:
                         track.title = title
                         break
@@ -265,19 +674,19 @@ class EnhancedNCSDownloader:
         artists_found = []
         for selector in artist_selectors:
             if selector.startswith('meta'):
-                element = soup.select_one(selector)
+                element = first(selector)
                 if element and element.get('content'):
                     artists_found.extend(self.parse_artists(element.get('content')))
                     break
             else:
-                elements = soup.select(selector)
+                elements = found.get(selector, ())
                 for element in elements:
                     text = element.get_text(strip=True)
                     if text and ('by' in text.lower() or len(text.split()) <= 4):
                         artists_found.extend(self.parse_artists(text))
         
         if artists_found:
-            track.artists = list(set(artists_found))  # Remove duplicates
+            track.artists = list(dict.fromkeys(artists_found))  # Remove duplicates, keeping page order
         
         # Extract genres/tags
         genre_selectors = [
@@ -290,11 +699,11 @@ class EnhancedNCSDownloader:
         genres_found = []
         for selector in genre_selectors:
             if selector.startswith('meta'):
-                element = soup.select_one(selector)
+                element = first(selector)
                 if element and element.get('content'):
                     genres_found.extend(self.parse_genres(element.get('content')))
             else:
-                elements = soup.select(selector)
+                elements = found.get(selector, ())
                 for element in elements:
                     text = element.get_text(strip=True)
                     if text:
@@ -304,7 +713,7 @@ class EnhancedNCSDownloader:
         if not genres_found:
             genres_found = ["Electronic"]
         
-        track.genres = list(set(genres_found))
+        track.genres = list(dict.fromkeys(genres_found))
         
         # Extract publish date
         date_selectors = [
@@ -316,12 +725,12 @@ class EnhancedNCSDownloader:
         
         for selector in date_selectors:
             if selector.startswith('meta'):
-                element = soup.select_one(selector)
+                element = first(selector)
                 if element and element.get('content'):
                     track.publish_date = self.parse_date(element.get('content'))
                     break
             else:
-                element = soup.select_one(selector)
+                element = first(selector)
                 if element:
                     # Check for datetime attribute
                     datetime_attr = element.get('datetime')
@@ -348,14 +757,14 @@ class EnhancedNCSDownloader:
         for selector in credit_selectors:
             if ':contains(' in selector:
                 # Handle BeautifulSoup limitation with :contains
-                elements = soup.find_all('p')
+                elements = found.get('p', ())
                 for elem in elements:
                     text = elem.get_text(strip=True)
                     if 'Music provided by' in text or 'NCS' in text:
                         track.credit_info = text
                         break
             else:
-                element = soup.select_one(selector)
+                element = first(selector)
                 if element:
                     track.credit_info = element.get_text(strip=True)
                     break
@@ -368,25 +777,14 @@ class EnhancedNCSDownloader:
         if not text:
             return []
         
-        # Clean common prefixes
-        text = re.sub(r'^(by|artist:?)\s*', '', text, flags=re.IGNORECASE)
-        
-        # Split by common separators
-        separators = [' feat. ', ' ft. ', ' & ', ' and ', ',', ' x ', ' X ']
-        artists = [text]
-        
-        for sep in separators:
-            new_artists = []
-            for artist in artists:
-                new_artists.extend([a.strip() for a in artist.split(sep)])
-            artists = new_artists
+        # Clean common prefixes and split by common separators
+        artists = _ARTIST_SPLIT.split(_BY_PREFIX.sub('', text))
         
         # Filter and clean
-        cleaned_artists = []
-        for artist in artists:
-            artist = artist.strip()
-            if artist and len(artist) > 1 and not artist.lower() in ['the', 'a', 'an']:
-                cleaned_artists.append(artist)
+        cleaned_artists = [
+            artist for artist in (a.strip() for a in artists)
+            if len(artist) > 1 and artist.lower() not in _ARTIST_STOP
+        ]
         
         return cleaned_artists[:5]  # Limit to 5 artists maximum
 
@@ -395,25 +793,13 @@ class EnhancedNCSDownloader:
         if not text:
             return []
         
-        # Common electronic music genres
-        known_genres = [
-            'House', 'Progressive House', 'Deep House', 'Tech House',
-            'Dubstep', 'Drum & Bass', 'DnB', 'Trap', 'Future Bass',
-            'Electro', 'Electronic', 'EDM', 'Ambient', 'Chill',
-            'Synthwave', 'Melodic Dubstep', 'Hardstyle', 'Trance'
-        ]
-        
-        text_lower = text.lower()
-        found_genres = []
-        
-        for genre in known_genres:
-            if genre.lower() in text_lower:
-                found_genres.append(genre)
+        # Match every known genre in a single pass, de-duplicated in order of appearance
+        found_genres = list(dict.fromkeys(_GENRE_CANON[m.lower()] for m in _GENRE_RE.findall(text)))
         
         # If no known genres found, try to extract from tags
         if not found_genres:
             # Split by common separators and capitalize
-            tags = re.split(r'[,;&|]', text)
+            tags = _GENRE_SPLIT.split(text)
             for tag in tags:
                 tag = tag.strip().title()
                 if tag and len(tag) > 2:
@@ -426,38 +812,77 @@ class EnhancedNCSDownloader:
         if not date_str:
             return None
         
-        # Common date formats
-        formats = [
-            '%Y-%m-%d',
-            '%Y-%m-%dT%H:%M:%S%z',
-            '%Y-%m-%dT%H:%M:%S',
-            '%d/%m/%Y',
-            '%m/%d/%Y',
-            '%B %d, %Y',
-            '%d %B %Y'
-        ]
-        
-        for fmt in formats:
-            try:
-                parsed = datetime.strptime(date_str.split('T')[0], fmt.split('T')[0])
-                return parsed.strftime('%Y-%m-%d')
-            except ValueError:
-                continue
+        return _parse_date_cached(date_str)
+
+    def find_download_url(self, soup: BeautifulSoup, page_url: str) -> Optional[str]:
+        """Find the audio download link in a parsed track page"""
+        for selector in _DOWNLOAD_SELECTORS:
+            element = soup.select_one(selector)
+            href = element.get('href') if element else None
+            if href and ('.mp3' in href or 'download' in href.lower()):
+                logger.info(f"Found download URL using selector: {selector}")
+                return urljoin(page_url, href)
+        return None
+
+    def get_track_details_static(self, track: Track) -> Optional[Track]:
+        """Get track details from the server-rendered HTML, or None if the page needs a browser"""
+        try:
+            self.wait_for_request_slot()
+            response = self.session.get(track.url, timeout=15)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"Could not fetch {track.url} directly: {e}")
+            return None
         
-        # Try to extract year at least
-        year_match = re.search(r'20\d{2}', date_str)
-        if year_match:
-            return f"{year_match.group()}-01-01"
+        soup = BeautifulSoup(response.text, _HTML_PARSER)
+        download_url = self.find_download_url(soup, track.url)
+        if not download_url:
+            return None
         
-        return None
+        enhanced_track = self.extract_track_metadata(soup, track.url)
+        enhanced_track.download_url = download_url
+        return enhanced_track
+
+    def wait_for_request_slot(self):
+        """Block until the rate limiter allows another request to NCS"""
+        if self.limiter:
+            self.limiter.acquire()
 
     def get_track_details_enhanced(self, track: Track) -> Track:
         """Get enhanced track details with comprehensive metadata extraction"""
+        cached = self.metadata_cache.get(track.url)
+        if cached:
+            try:
+                enhanced_track = Track(**cached)
+            except (TypeError, KeyError):
+                # Written by an older version of Track; fetch the page again instead
+                logger.info(f"Discarding stale cached details for {track.url}")
+                self.metadata_cache.discard(track.url)
+            else:
+                logger.info(f"Using cached details: {enhanced_track.title} by {enhanced_track.artists}")
+                return enhanced_track
+        
+        # Most track pages are static, so try a plain GET before starting Chrome
+        enhanced_track = self.get_track_details_static(track)
+        if enhanced_track:
+            logger.info(f"Enhanced track details: {enhanced_track.title} by {enhanced_track.artists}")
+        else:
+            # One browser serves every worker, so pages are loaded through it one at a time
+            with self._driver_lock:
+                enhanced_track = self._get_track_details_selenium(track)
+        
+        # Only complete results are cached, so pages that failed are retried next run
+        if enhanced_track and enhanced_track.download_url:
+            self.metadata_cache.put(track.url, enhanced_track.to_dict())
+        return enhanced_track
+
+    def _get_track_details_selenium(self, track: Track) -> Track:
         if not self.driver:
             self.driver = self.setup_driver()
         
         try:
             logger.info(f"Getting enhanced details for track: {track.url}")
+            self.wait_for_request_slot()
             self.driver.get(track.url)
             
             WebDriverWait(self.driver, 10).until(
@@ -466,33 +891,13 @@ class EnhancedNCSDownloader:
             time.sleep(self.delay)
             
             # Parse page content
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            soup = BeautifulSoup(self.driver.page_source, _HTML_PARSER)
             
             # Extract comprehensive metadata
             enhanced_track = self.extract_track_metadata(soup, track.url)
             
-            # Find download URL
-            download_url = None
-            download_selectors = [
-                "a[href*='.mp3']",
-                "a[download]",
-                "*[class*='download'] a",
-                "button[onclick*='download']",
-                "a[href*='download']"
-            ]
-            
-            for selector in download_selectors:
-                try:
-                    element = self.driver.find_element(By.CSS_SELECTOR, selector)
-                    href = element.get_attribute('href')
-                    if href and ('.mp3' in href or 'download' in href.lower()):
-                        download_url = href
-                        logger.info(f"Found download URL using selector: {selector}")
-                        break
-                except NoSuchElementException:
-                    continue
-            
-            enhanced_track.download_url = download_url
+            # Find download URL in the same parsed page, resolving links as the browser would
+            enhanced_track.download_url = self.find_download_url(soup, self.driver.current_url)
             
             logger.info(f"Enhanced track details: {enhanced_track.title} by {enhanced_track.artists}")
             
@@ -510,6 +915,17 @@ class EnhancedNCSDownloader:
             logger.info(f"Track already exists in database: {existing_id}")
             return True
         
+        if not self.download_track(track):
+            return False
+        
+        # add_tracks checks for the track again under the database lock, so a copy
+        # added by another worker since the check above is not stored twice
+        track_id = self.db.add_tracks([track])[0]
+        logger.info(f"Added to database: {track.title} ({track_id})")
+        return True
+
+    def download_track(self, track: Track) -> bool:
+        """Download a track's audio file and fill in its file_path and file_size"""
         if not track.download_url:
             logger.warning(f"No download URL for track: {track.title}")
             return False
@@ -525,15 +941,11 @@ class EnhancedNCSDownloader:
                 logger.info(f"File already exists: {safe_filename}")
                 track.file_path = str(file_path)
                 track.file_size = file_path.stat().st_size
-                self.db.add_track(track)
-                self.db.save_database()
                 return True
             
             if self.dry_run:
                 logger.info(f"DRY RUN: Would download {safe_filename} from {track.download_url}")
                 track.file_path = str(file_path)
-                self.db.add_track(track)
-                self.db.save_database()
                 return True
             
             logger.info(f"Downloading: {safe_filename}")
@@ -543,34 +955,26 @@ class EnhancedNCSDownloader:
                 logger.warning(f"Invalid download URL: {track.download_url}")
                 return False
             
-            # Download file
-            response = self.session.get(track.download_url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded_size = 0
-            
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
+            # Download file, copying the raw stream to disk in 1 MB blocks
+            self.wait_for_request_slot()
+            with self.session.get(track.download_url, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                with open(file_path, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, length=1 << 20)
             
             # Verify file
-            if file_path.stat().st_size == 0:
+            size = file_path.stat().st_size
+            if size == 0:
                 file_path.unlink()
                 logger.error(f"Downloaded file is empty: {safe_filename}")
                 return False
             
             # Update track info
             track.file_path = str(file_path)
-            track.file_size = file_path.stat().st_size
-            
-            # Add to database
-            track_id = self.db.add_track(track)
-            self.db.save_database()
+            track.file_size = size
             
-            logger.info(f"Successfully downloaded and added to database: {safe_filename} ({track_id})")
+            logger.info(f"Successfully downloaded: {safe_filename}")
             return True
             
         except Exception as e:
@@ -584,15 +988,20 @@ class EnhancedNCSDownloader:
 
     def validate_download_url(self, url: str) -> bool:
         """Validate download URL"""
+        # A direct link to an audio file needs no HEAD round trip; the download itself checks the status
+        has_audio_ext = url.lower().split('?', 1)[0].endswith(_AUDIO_EXTS)
+        if has_audio_ext:
+            return True
+        
         try:
+            self.wait_for_request_slot()
             response = self.session.head(url, timeout=10)
             content_type = response.headers.get('content-type', '').lower()
             
             audio_types = ['audio/', 'application/octet-stream']
             is_audio = any(audio_type in content_type for audio_type in audio_types)
-            has_audio_ext = url.lower().endswith(('.mp3', '.wav', '.flac', '.m4a'))
             
-            return response.status_code == 200 and (is_audio or has_audio_ext)
+            return response.status_code == 200 and is_audio
             
         except Exception as e:
             logger.warning(f"Could not validate download URL {url}: {e}")
@@ -600,17 +1009,7 @@ class EnhancedNCSDownloader:
 
     def sanitize_filename(self, filename: str) -> str:
         """Sanitize filename for safe file system usage"""
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            filename = filename.replace(char, '_')
-        
-        filename = re.sub(r'[_\s]+', '_', filename)
-        
-        if len(filename) > 200:
-            name, ext = os.path.splitext(filename)
-            filename = name[:200-len(ext)] + ext
-        
-        return filename
+        return _sanitize_filename_cached(filename)
 
     def discover_tracks_sample(self) -> List[Track]:
         """Discover sample tracks for testing - replace with actual discovery logic"""
@@ -640,37 +1039,70 @@ class EnhancedNCSDownloader:
             stats['total'] = len(tracks)
             logger.info(f"Starting enhanced download of {len(tracks)} tracks...")
             
-            for i, track in enumerate(tracks, 1):
-                logger.info(f"Processing track {i}/{len(tracks)}: {track.title}")
+            pending = []
+            queued = set()
+            for track in tracks:
+                # Check if already in database
+                if self.db.track_exists(track):
+                    stats['already_in_db'] += 1
+                    logger.info(f"Track already in database: {track.title}")
+                    continue
                 
+                # Workers run in parallel, so the same track discovered twice would be
+                # downloaded to the same file by two of them at once
+                key = (track.title.lower(), track.url)
+                if key in queued:
+                    stats['skipped'] += 1
+                    logger.info(f"Skipping duplicate track: {track.title}")
+                    continue
+                queued.add(key)
+                pending.append(track)
+            
+            # Metadata is fetched by up to max_concurrent workers; each track with a
+            # download URL is handed straight to a smaller download pool so the NCS
+            # servers are not saturated. Each download is recorded in the database as soon
+            # as it finishes (a single sidecar append), so an interrupted run never leaves
+            # files on disk that the next run would download again.
+            max_downloads = max(1, self.max_concurrent // 2)
+            with ThreadPoolExecutor(max_workers=self.max_concurrent) as metadata_pool, \
+                    ThreadPoolExecutor(max_workers=max_downloads) as download_pool:
                 try:
-                    # Check if already in database
-                    if self.db.track_exists(track):
-                        stats['already_in_db'] += 1
-                        logger.info(f"Track already in database: {track.title}")
-                        continue
-                    
-                    # Get enhanced track details
-                    track = self.get_track_details_enhanced(track)
-                    
-                    if not track.download_url:
-                        stats['invalid_urls'] += 1
-                        continue
+                    metadata_futures = {metadata_pool.submit(self.get_track_details_enhanced, track): track for track in pending}
+                    download_futures = {}
+                    for i, future in enumerate(as_completed(metadata_futures), 1):
+                        track = metadata_futures[future]
+                        logger.info(f"Processed metadata {i}/{len(pending)}: {track.title}")
+                        try:
+                            track = future.result()
+                        except Exception as e:
+                            logger.error(f"Error processing track {track.title}: {e}")
+                            stats['failed'] += 1
+                            continue
+                        
+                        if not track.download_url:
+                            stats['invalid_urls'] += 1
+                            continue
+                        
+                        download_futures[download_pool.submit(self.download_track_with_database, track)] = track
                     
-                    # Download and add to database
-                    if self.download_track_with_database(track):
-                        stats['success'] += 1
-                    else:
-                        stats['failed'] += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error processing track {track.title}: {e}")
-                    stats['failed'] += 1
-                
-                time.sleep(self.delay)
+                    for future in as_completed(download_futures):
+                        try:
+                            if future.result():
+                                stats['success'] += 1
+                            else:
+                                stats['failed'] += 1
+                        except Exception as e:
+                            logger.error(f"Error processing track {download_futures[future].title}: {e}")
+                            stats['failed'] += 1
+                except BaseException:
+                    # Leaving the with block waits for every queued task, so on Ctrl-C or an
+                    # error drop the ones that have not started yet; running ones still finish
+                    metadata_pool.shutdown(wait=False, cancel_futures=True)
+                    download_pool.shutdown(wait=False, cancel_futures=True)
+                    raise
             
             # Final database save and stats
-            self.db.save_database()
+            self.db.save_database(force=True)
             db_stats = self.db.get_stats()
             stats.update({'database_stats': db_stats})
             
@@ -687,8 +1119,7 @@ class EnhancedNCSDownloader:
         """Export database in various formats"""
         if format_type == "json":
             export_path = self.download_dir / "tracks_export.json"
-            with open(export_path, 'w', encoding='utf-8') as f:
-                json.dump(self.db.data, f, indent=4, ensure_ascii=False)
+            dump_json(self.db.data, export_path)
         
         elif format_type == "csv":
             import csv
@@ -716,6 +1147,8 @@ class EnhancedNCSDownloader:
         if self.driver:
             self.driver.quit()
             self.driver = None
+        self.session.close()
+        self.db.close()
         logger.info("Resources cleaned up")
 
 def main():
@@ -734,7 +1167,7 @@ def main():
         downloader = EnhancedNCSDownloader(download_dir=download_dir, dry_run=True)
         stats = downloader.db.get_stats()
         print("\nDatabase Statistics:")
-        print(json.dumps(stats, indent=2))
+        print(format_json(stats))
         return
     
     elif choice == "3":
@@ -775,8 +1208,16 @@ def main():
             print("Invalid number, downloading all tracks")
             limit = None
     
+    try:
+        concurrent_input = input("Max concurrent requests (default: 4): ").strip()
+        max_concurrent = max(1, int(concurrent_input)) if concurrent_input else 4
+    except ValueError:
+        print("Invalid number, using 4 concurrent requests")
+        max_concurrent = 4
+    
     # Initialize enhanced downloader
-    downloader = EnhancedNCSDownloader(download_dir=download_dir, delay=2.0, dry_run=dry_run)
+    downloader = EnhancedNCSDownloader(download_dir=download_dir, delay=2.0, dry_run=dry_run,
+                                       max_concurrent=max_concurrent)
     
     try:
         # Start enhanced download process
@@ -800,12 +1241,12 @@ def main():
             
             if db_stats['genres']:
                 print(f"\nTop genres:")
-                for genre, count in list(db_stats['genres'].items())[:5]:
+                for genre, count in islice(db_stats['genres'].items(), 5):
                     print(f"  {genre}: {count} tracks")
             
             if db_stats['artists']:
                 print(f"\nTop artists:")
-                for artist, count in list(db_stats['artists'].items())[:5]:
+                for artist, count in islice(db_stats['artists'].items(), 5):
                     print(f"  {artist}: {count} tracks")
         
         if dry_run:
@@ -817,10 +1258,10 @@ def main():
         
     except KeyboardInterrupt:
         print("\nProcess interrupted by user")
-        downloader.db.save_database()  # Save database even if interrupted
+        downloader.db.save_database(force=True)  # Save database even if interrupted
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
-        downloader.db.save_database()  # Save database on error
+        downloader.db.save_database(force=True)  # Save database on error
     finally:
         downloader.cleanup()
 
@@ -6,24 +6,33 @@ Tests all functionality including database management, metadata extraction, and
 
 import unittest
 import json
+import re
 import tempfile
+import time
 import shutil
+from collections import Counter
 from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
 import os
 import sys
 
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
 # Add the parent directory to sys.path to import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
     from .downloader_v2 import Track, TrackDatabase, EnhancedNCSDownloader
-    from .data_manager import DatabaseManager
+    from .data_manager import DatabaseManager, SearchHit
 except ImportError:
     print("Warning: Could not import modules. Running in standalone mode.")
     
     # Mock classes for standalone testing
+    from collections import namedtuple
     from dataclasses import dataclass
     from typing import List, Optional
     
@@ -39,6 +48,8 @@ except ImportError:
         file_size: Optional[int] = None
         file_path: Optional[str] = None
         track_id: Optional[str] = None
+    
+    SearchHit = namedtuple('SearchHit', 'track_id data')
 
 class TestTrackDatabase(unittest.TestCase):
     """Test the TrackDatabase class"""
@@ -72,6 +83,7 @@ class TestTrackDatabase(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment"""
+        self.db.close()
         shutil.rmtree(self.test_dir)
     
     def test_database_initialization(self):
@@ -119,6 +131,86 @@ class TestTrackDatabase(unittest.TestCase):
         self.assertIn(track_id, new_db.data["tracks"])
         self.assertEqual(new_db.data["tracks"][track_id]["title"], "Test Song 1")
     
+    def test_streamed_load(self):
+        """Test large databases are loaded incrementally with ijson"""
+        module = sys.modules[TrackDatabase.__module__]
+        if getattr(module, "ijson", None) is None:
+            self.skipTest("ijson is not installed")
+        
+        track_id = self.db.add_track(self.sample_track1)
+        self.db.save_database(force=True)
+        
+        with patch.object(module, "_STREAM_LOAD_THRESHOLD", 0):
+            new_db = TrackDatabase(str(self.db_path))
+        self.assertEqual(new_db.data, self.db.data)
+        self.assertEqual(new_db.track_exists(self.sample_track1), track_id)
+    
+    def test_sync_modes(self):
+        """Test fsync policy for appends and saves"""
+        with self.assertRaises(ValueError):
+            TrackDatabase(str(self.db_path), sync_mode="sometimes")
+        
+        self.db.close()
+        self.db = TrackDatabase(str(self.db_path), sync_mode="always")
+        with patch("os.fsync") as fsync:
+            self.db.add_track(self.sample_track1)
+            self.db.save_database(force=True)
+        self.assertEqual(fsync.call_count, 2)
+        
+        self.db.close()
+        self.db = TrackDatabase(str(self.db_path), sync_mode="off")
+        with patch("os.fsync") as fsync:
+            self.db.add_track(self.sample_track2)
+            self.db.save_database(force=True)
+        fsync.assert_not_called()
+    
+    def test_add_tracks_batch(self):
+        """Test adding several tracks at once skips ones already stored"""
+        track_id1 = self.db.add_track(self.sample_track1)
+        
+        track_ids = self.db.add_tracks([self.sample_track1, self.sample_track2])
+        self.assertEqual(track_ids[0], track_id1)
+        self.assertEqual(len(self.db.data["tracks"]), 2)
+        self.assertEqual(self.db.track_exists(self.sample_track2), track_ids[1])
+    
+    def test_remove_track(self):
+        """Test removing a track updates lookups and statistics"""
+        track_id1 = self.db.add_track(self.sample_track1)
+        self.db.add_track(self.sample_track2)
+        
+        self.assertTrue(self.db.remove_track(track_id1))
+        self.assertFalse(self.db.remove_track(track_id1))
+        self.assertIsNone(self.db.track_exists(self.sample_track1))
+        
+        stats = self.db.get_stats()
+        self.assertEqual(stats["total_tracks"], 1)
+        self.assertEqual(stats["total_file_size"], 1024*1024*7)
+        self.assertNotIn("Electronic", stats["genres"])
+        
+        # The removal is persisted
+        new_db = TrackDatabase(str(self.db_path))
+        self.assertNotIn(track_id1, new_db.data["tracks"])
+    
+    def test_unsaved_tracks_replayed(self):
+        """Test tracks added without a save are recovered from the JSONL sidecar"""
+        track_id = self.db.add_track(self.sample_track1)
+        self.assertTrue(self.db.jsonl_path.exists())
+        
+        # Reload without saving, as after a crash
+        new_db = TrackDatabase(str(self.db_path))
+        self.assertIn(track_id, new_db.data["tracks"])
+        self.assertEqual(new_db.track_exists(self.sample_track1), track_id)
+        
+        # Torn and id-less lines are skipped rather than aborting the load
+        with open(self.db.jsonl_path, 'ab') as f:
+            f.write(b'{"title": "No id"}\n{"id": "track_torn", "tit')
+        new_db = TrackDatabase(str(self.db_path))
+        self.assertEqual(list(new_db.data["tracks"]), [track_id])
+        
+        # Saving folds the sidecar into the main file
+        new_db.save_database(force=True)
+        self.assertFalse(self.db.jsonl_path.exists())
+    
     def test_database_stats(self):
         """Test database statistics generation"""
         # Add sample tracks
@@ -145,6 +237,37 @@ class TestMetadataExtraction(unittest.TestCase):
         """Clean up test environment"""
         shutil.rmtree(self.test_dir)
     
+    @unittest.skipIf(BeautifulSoup is None, "bs4 is not installed")
+    def test_extract_track_metadata(self):
+        """Test the real metadata extraction on a small track page"""
+        html = """
+        <html><head>
+            <title>Fade - NCS</title>
+            <meta property="og:title" content="Fade">
+            <meta name="author" content="Alan Walker">
+            <meta name="keywords" content="Progressive House, NCS">
+        </head><body>
+            <h1>Fade [NCS Release]</h1>
+            <div class="track-artist">by Alan Walker feat. Noah Cyrus</div>
+            <span class="genre-label">Progressive House</span>
+            <time datetime="2014-11-19T10:00:00Z">19 November 2014</time>
+            <p class="credit-line">Music provided by NoCopyrightSounds</p>
+        </body></html>
+        """
+        downloader = EnhancedNCSDownloader(self.test_dir, delay=0)
+        try:
+            track = downloader.extract_track_metadata(BeautifulSoup(html, "html.parser"), "https://ncs.io/fade")
+            
+            self.assertEqual(track.title, "Fade")
+            self.assertEqual(track.artists, ["Alan Walker", "Noah Cyrus"])
+            # The longest known genre wins, so "Progressive House" does not also yield "House"
+            self.assertEqual(track.genres, ["Progressive House"])
+            self.assertEqual(track.publish_date, "2014-11-19")
+            self.assertEqual(track.credit_info, "Music provided by NoCopyrightSounds")
+            self.assertEqual(downloader.parse_genres("Progressive House & Trance"), ["Progressive House", "Trance"])
+        finally:
+            downloader.cleanup()
+    
     def test_parse_artists(self):
         """Test artist name parsing"""
         # This would test the actual parse_artists method
@@ -156,19 +279,14 @@ class TestMetadataExtraction(unittest.TestCase):
         ]
         
         # Mock the parse_artists method
+        artist_split = re.compile(r'\s*(?:feat\.?|ft\.?|&|\bx\b|,|;)\s*', re.IGNORECASE)
+        
         def mock_parse_artists(text):
-            if "feat." in text or "ft." in text:
-                return [a.strip() for a in text.replace("feat.", "&").replace("ft.", "&").split("&")]
-            elif "&" in text:
-                return [a.strip() for a in text.split("&")]
-            elif "x" in text:
-                return [a.strip() for a in text.split("x")]
-            else:
-                return [text.strip()]
+            return [a for a in artist_split.split(text.strip()) if a]
         
         for input_text, expected in test_cases:
             result = mock_parse_artists(input_text)
-            self.assertEqual(len(result), len(expected))
+            self.assertEqual(result, expected)
     
     def test_parse_genres(self):
         """Test genre parsing"""
@@ -179,15 +297,10 @@ class TestMetadataExtraction(unittest.TestCase):
         ]
         
         # Mock genre parsing
+        genre_split = re.compile(r'\s*[,&|;]\s*')
+        
         def mock_parse_genres(text):
-            separators = [",", "&", "|", ";"]
-            genres = [text]
-            for sep in separators:
-                new_genres = []
-                for genre in genres:
-                    new_genres.extend([g.strip() for g in genre.split(sep)])
-                genres = new_genres
-            return [g for g in genres if g]
+            return [g for g in genre_split.split(text.strip()) if g]
         
         for input_text, expected_count in test_cases:
             result = mock_parse_genres(input_text)
@@ -279,6 +392,65 @@ class TestDatabaseManager(unittest.TestCase):
         """Clean up test environment"""
         shutil.rmtree(self.test_dir)
     
+    def test_append_reload_and_compact(self):
+        """Test appended tracks survive a reload and are folded in by compact"""
+        manager = DatabaseManager(str(self.db_path))
+        manager.append_track("track_zed", {"title": "Zed", "artists": ["Zed Artist"], "genres": ["House"]})
+        self.assertTrue(manager.jsonl_path.exists())
+        
+        # Torn and id-less lines are skipped rather than aborting the load
+        with open(manager.jsonl_path, 'ab') as f:
+            f.write(b'{"title": "No id"}\n{"id": "track_torn", "tit')
+        
+        reloaded = DatabaseManager(str(self.db_path))
+        self.assertEqual(len(reloaded.data["tracks"]), 3)
+        self.assertEqual([hit.track_id for hit in reloaded.search_tracks("zed")], ["track_zed"])
+        
+        reloaded.compact()
+        self.assertFalse(reloaded.jsonl_path.exists())
+        compacted = DatabaseManager(str(self.db_path))
+        self.assertEqual(compacted.data, reloaded.data)
+    
+    def test_streaming_includes_appended_tracks(self):
+        """Test streaming mode sees tracks that are only in the JSONL sidecar"""
+        manager = DatabaseManager(str(self.db_path))
+        manager.append_track("track_zed", {"title": "Zed", "artists": ["Zed Artist"], "genres": ["House"]})
+        manager.append_track("track_test_1", dict(manager.data["tracks"]["track_test_1"], title="Renamed"))
+        
+        streaming = DatabaseManager(str(self.db_path), streaming=True)
+        if not streaming.streaming:
+            self.skipTest("ijson is not installed")
+        
+        self.assertEqual([hit.track_id for hit in streaming.search_tracks("zed")], ["track_zed"])
+        self.assertEqual(dict(streaming.iter_tracks()), manager.data["tracks"])
+        self.assertEqual(streaming.get_detailed_stats()["total_tracks"], 3)
+    
+    def test_streaming_reads_floats(self):
+        """Test streamed tracks come back with floats, not Decimals, like a full load"""
+        manager = DatabaseManager(str(self.db_path))
+        manager.data["tracks"]["track_test_1"]["file_size"] = 1536.5
+        manager.save_database()
+        
+        streaming = DatabaseManager(str(self.db_path), streaming=True)
+        if not streaming.streaming:
+            self.skipTest("ijson is not installed")
+        
+        self.assertEqual(dict(streaming.iter_tracks()), manager.data["tracks"])
+        self.assertIs(type(dict(streaming.iter_tracks())["track_test_1"]["file_size"]), float)
+        # The stats cache is written as JSON, which rejects Decimal
+        streaming.get_detailed_stats()
+        self.assertTrue(self.db_path.with_suffix(".stats.json").exists())
+    
+    def test_detailed_stats_cached_shape(self):
+        """Test cached and freshly computed stats are identical"""
+        manager = DatabaseManager(str(self.db_path))
+        fresh = manager.get_detailed_stats()
+        cached = manager.get_detailed_stats()
+        
+        self.assertTrue(manager.db_path.with_suffix(".stats.json").exists())
+        self.assertEqual(fresh, cached)
+        self.assertEqual(fresh["genres"]["top"], [["Electronic", 1], ["Dubstep", 1]])
+    
     def test_search_functionality(self):
         """Test search functionality"""
         def mock_search_tracks(query, field="all"):
@@ -298,21 +470,19 @@ class TestDatabaseManager(unittest.TestCase):
                         match = True
                 
                 if match:
-                    result = track_data.copy()
-                    result["track_id"] = track_id
-                    results.append(result)
+                    results.append(SearchHit(track_id, track_data))
             
             return results
         
         # Test title search
         results = mock_search_tracks("Test Song")
         self.assertEqual(len(results), 1)
-        self.assertEqual(results[0]["title"], "Test Song 1")
+        self.assertEqual(results[0].data["title"], "Test Song 1")
         
         # Test artist search
         results = mock_search_tracks("Test Artist 2", "artist")
         self.assertEqual(len(results), 1)
-        self.assertEqual(results[0]["title"], "Another Song")
+        self.assertEqual(results[0].data["title"], "Another Song")
     
     def test_stats_generation(self):
         """Test statistics generation"""
@@ -320,27 +490,20 @@ class TestDatabaseManager(unittest.TestCase):
             tracks = self.db_manager.data["tracks"]
             total_tracks = len(tracks)
             
-            genre_counts = {}
-            artist_counts = {}
+            genre_counts = Counter()
+            artist_counts = Counter()
             total_size = 0
             
             for track_data in tracks.values():
-                # Count genres
-                for genre in track_data.get("genres", []):
-                    genre_counts[genre] = genre_counts.get(genre, 0) + 1
-                
-                # Count artists
-                for artist in track_data.get("artists", []):
-                    artist_counts[artist] = artist_counts.get(artist, 0) + 1
-                
-                # Sum file sizes
+                genre_counts.update(track_data.get("genres", ()))
+                artist_counts.update(track_data.get("artists", ()))
                 total_size += track_data.get("file_size", 0)
             
             return {
                 "total_tracks": total_tracks,
                 "total_file_size_mb": round(total_size / (1024 * 1024), 2),
-                "genres": {"counts": genre_counts},
-                "artists": {"counts": artist_counts}
+                "genres": {"counts": dict(genre_counts)},
+                "artists": {"counts": dict(artist_counts)}
             }
         
         stats = mock_get_detailed_stats()
@@ -364,10 +527,7 @@ class TestFileOperations(unittest.TestCase):
     def test_filename_sanitization(self):
         """Test filename sanitization"""
         def sanitize_filename(filename):
-            import re
-            invalid_chars = '<>:"/\\|?*'
-            for char in invalid_chars:
-                filename = filename.replace(char, '_')
+            filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
             filename = re.sub(r'[_\s]+', '_', filename)
             return filename[:200]  # Limit length
         
@@ -494,6 +654,71 @@ class TestIntegration(unittest.TestCase):
         """Clean up integration test environment"""
         shutil.rmtree(self.test_dir)
     
+    def test_interrupted_run_cancels_pending_work(self):
+        """Test Ctrl-C during a run cancels queued metadata fetches instead of draining them"""
+        downloader = EnhancedNCSDownloader(str(self.download_dir), delay=0, max_concurrent=2)
+        tracks = [Track(title=f"Song {i}", artists=[], genres=[], url=f"https://example.com/{i}") for i in range(40)]
+        calls = []
+        
+        def fetch(track):
+            calls.append(track.url)
+            if len(calls) == 1:
+                raise KeyboardInterrupt
+            time.sleep(0.05)
+            return track
+        
+        with patch.object(downloader, "discover_tracks_sample", return_value=tracks), \
+                patch.object(downloader, "get_track_details_enhanced", side_effect=fetch):
+            with self.assertRaises(KeyboardInterrupt):
+                downloader.download_all_enhanced()
+        
+        # Only the tasks already running when the interrupt arrived were allowed to finish
+        self.assertLess(len(calls), 5)
+    
+    def test_duplicate_tracks_downloaded_once(self):
+        """Test a track discovered twice is downloaded and stored only once"""
+        downloader = EnhancedNCSDownloader(str(self.download_dir), delay=0, max_concurrent=4)
+        tracks = [
+            Track(title="Fade", artists=[], genres=[], url="https://example.com/fade"),
+            Track(title="fade", artists=[], genres=[], url="https://example.com/fade"),
+            Track(title="Spectre", artists=[], genres=[], url="https://example.com/spectre")
+        ]
+        downloaded = []
+        
+        def fetch(track):
+            return Track(title=track.title, artists=["Alan Walker"], genres=[], url=track.url,
+                         download_url=track.url + ".mp3")
+        
+        def download(track):
+            downloaded.append(track.url)
+            return True
+        
+        with patch.object(downloader, "discover_tracks_sample", return_value=tracks), \
+                patch.object(downloader, "get_track_details_enhanced", side_effect=fetch), \
+                patch.object(downloader, "download_track", side_effect=download):
+            stats = downloader.download_all_enhanced()
+        
+        self.assertEqual(sorted(downloaded), ["https://example.com/fade", "https://example.com/spectre"])
+        self.assertEqual(stats["skipped"], 1)
+        self.assertEqual(stats["database_stats"]["total_tracks"], 2)
+    
+    def test_stale_metadata_cache_refetched(self):
+        """Test cache entries from an older Track schema are dropped and fetched again"""
+        downloader = EnhancedNCSDownloader(str(self.download_dir), delay=0)
+        try:
+            url = "https://example.com/test1"
+            downloader.metadata_cache.put(url, {"title": "Old", "artists": [], "genres": [], "bpm": 128})
+            fresh = Track(title="Test Song 1", artists=["Test Artist 1"], genres=["House"],
+                          url=url, download_url="https://example.com/test1.mp3")
+            
+            with patch.object(downloader, "get_track_details_static", return_value=fresh):
+                result = downloader.get_track_details_enhanced(Track(title="", artists=[], genres=[], url=url))
+            
+            self.assertEqual(result, fresh)
+            self.assertEqual(downloader.metadata_cache.get(url), fresh.to_dict())
+        finally:
+            downloader.cleanup()
+    
     def test_end_to_end_workflow(self):
         """Test complete workflow from discovery to database storage"""
         # Mock the complete workflow
@@ -518,13 +743,8 @@ class TestIntegration(unittest.TestCase):
             
             # Step 3: Database storage
             db = TrackDatabase(str(self.download_dir / "test_db.json"))
-            stored_tracks = []
-            
-            for track in enhanced_tracks:
-                track_id = db.add_track(track)
-                stored_tracks.append(track_id)
-            
-            db.save_database()
+            stored_tracks = db.add_tracks(enhanced_tracks)
+            db.save_database(force=True)
             
             return {
                 "discovered": len(discovered_tracks),
@@ -554,7 +774,7 @@ class TestIntegration(unittest.TestCase):
             url="https://example.com/test1"
         )
         track_id1 = db1.add_track(track1)
-        db1.save_database()
+        db1.save_database(force=True)
         
         # Load database in new instance and add another track
         db2 = TrackDatabase(str(db_path))
@@ -565,7 +785,7 @@ class TestIntegration(unittest.TestCase):
             url="https://example.com/test2"
         )
         track_id2 = db2.add_track(track2)
-        db2.save_database()
+        db2.save_database(force=True)
         
         # Verify both tracks exist
         db3 = TrackDatabase(str(db_path))
@@ -0,0 +1,95 @@
+"""
+JSON helpers shared by the NCS downloader and the database manager
+Reading, writing and printing JSON, and the JSONL sidecar of appended tracks
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_json(path: Path) -> Any:
+    """Parse a JSON file, preferring orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def dump_json(data: Any, path: Path, pretty: bool = True):
+    """Write data as UTF-8 JSON, indented or compact, preferring orjson when it is installed"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        path.write_bytes(orjson.dumps(data, option=option))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        if pretty:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        else:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def replace_json(data: Any, path: Path, pretty: bool = False, fsync: bool = False):
+    """
+    Atomically replace a JSON file with data
+
+    Write a temporary file and swap it in so a crash never leaves a torn database.
+    With fsync the temporary file is synced before the swap, so the rename never
+    exposes a file whose contents have not reached the disk.
+    """
+    tmp_path = path.with_suffix(".tmp")
+    dump_json(data, tmp_path, pretty=pretty)
+    if fsync:
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def format_json(data: Any) -> str:
+    """Render data as indented JSON for printing, preferring orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def dumps_line(record: Dict[str, Any]) -> bytes:
+    """Encode a record as one newline-terminated JSON line"""
+    if orjson is not None:
+        return orjson.dumps(record) + b"\n"
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+def read_appended(jsonl_path: Path) -> Tuple[Dict[str, Dict[str, Any]], int, int]:
+    """
+    Read the tracks appended to a JSONL sidecar, later lines replacing earlier ones
+
+    Returns the tracks by ID, the number of lines read and the number of those
+    lines that had to be skipped.
+    """
+    tracks = {}
+    lines = 0
+    skipped = 0
+    if not jsonl_path.exists():
+        return tracks, lines, skipped
+
+    with open(jsonl_path, 'rb') as f:
+        for line in f:
+            lines += 1
+            try:
+                record = orjson.loads(line) if orjson is not None else json.loads(line)
+            except ValueError:
+                # A torn final line from an interrupted append
+                skipped += 1
+                continue
+            track_id = record.pop("id", None) if isinstance(record, dict) else None
+            if track_id is None:
+                skipped += 1
+                continue
+            tracks[track_id] = record
+    return tracks, lines, skipped
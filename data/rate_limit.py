@@ -0,0 +1,37 @@
+"""
+Rate limiting shared by the NCS downloaders
+Spaces requests to ncs.io out over time instead of sleeping a fixed delay between them
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing at most `rate` requests every `period` seconds
+
+    The bucket holds up to `rate` tokens, so a burst of `rate` requests can go out at
+    once; tokens are then refilled continuously at rate / period per second, and
+    acquire() sleeps only while the bucket is empty.
+    """
+
+    def __init__(self, rate, period):
+        self.capacity = rate
+        self.refill_per_sec = rate / period
+        self.tokens = rate
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, blocking until one is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_per_sec)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.refill_per_sec
+            time.sleep(wait)
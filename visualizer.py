@@ -1,10 +1,93 @@
 import os
 import json
-import librosa
+import torch
+import torchaudio
 import numpy as np
 import matplotlib.pyplot as plt
+from torch.utils.data import Dataset, DataLoader
+
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+
+
+class MelBatchExtractor(Dataset):
+    """Computes log2 mel spectrograms for many files, one batched STFT per batch_size tracks"""
+
+    # Mel filterbanks keyed by sample rate, shared by every caller so each is built only once
+    _mel_transforms = {}
+
+    def __init__(self, audio_file_paths, sample_rate=44100, batch_size=32, num_workers=4):
+        self.audio_file_paths = list(audio_file_paths)
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+
+    def __len__(self):
+        return len(self.audio_file_paths)
+
+    def __getitem__(self, index):
+        waveform, sample_rate = torchaudio.load(self.audio_file_paths[index])
+        # Tracks are batched together, so bring them all to mono at one sample rate
+        waveform = waveform.mean(dim=0)
+        if sample_rate != self.sample_rate:
+            waveform = torchaudio.functional.resample(waveform, sample_rate, self.sample_rate)
+        return waveform, waveform.shape[0]
+
+    @staticmethod
+    def collate(items):
+        """Right-pad waveforms to the longest in the batch; returns (waveforms, lengths)"""
+        waveforms, lengths = zip(*items)
+        batch = torch.nn.utils.rnn.pad_sequence(waveforms, batch_first=True)
+        return batch, torch.tensor(lengths)
+
+    @classmethod
+    def mel_transform(cls, sample_rate):
+        if sample_rate not in cls._mel_transforms:
+            cls._mel_transforms[sample_rate] = torchaudio.transforms.MelSpectrogram(
+                sample_rate=sample_rate, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=N_MELS
+            ).to(DEVICE)
+        return cls._mel_transforms[sample_rate]
+
+    @classmethod
+    def melspectrogram(cls, waveforms, sample_rate):
+        """Log2 mel spectrogram of (..., samples) waveforms, shaped (..., n_mels, frames)"""
+        with torch.inference_mode():
+            mel = cls.mel_transform(sample_rate)(waveforms.to(DEVICE, non_blocking=True))
+            return mel.clamp(min=1e-10).log2()
+
+    def batches(self):
+        """
+        Yield (mels, mask) per batch: mels is (batch, n_mels, frames) on the device and
+        mask is (batch, frames), False for frames that only cover padding
+        """
+        loader = DataLoader(
+            self,
+            batch_size=self.batch_size,
+            num_workers=self.num_workers,
+            pin_memory=DEVICE.type == "cuda",
+            collate_fn=self.collate,
+        )
+        for waveforms, lengths in loader:
+            mels = self.melspectrogram(waveforms, self.sample_rate)
+            # Centred STFT frames: one per hop, plus the frame at sample 0
+            frame_lengths = lengths.to(DEVICE) // HOP_LENGTH + 1
+            mask = torch.arange(mels.shape[-1], device=DEVICE) < frame_lengths[:, None]
+            yield mels, mask
+
+    def extract(self):
+        """Log2 mel spectrogram per file, in path order, with padding frames removed"""
+        spectrograms = []
+        for mels, mask in self.batches():
+            for mel, valid in zip(mels, mask):
+                spectrograms.append(mel[:, valid])
+        return spectrograms
+
 
 class AudioVisualizer:
+    device = DEVICE
+
     def __init__(self, audio_file_path, metadata_file_path, output_file_path):
         self.audio_file_path = audio_file_path
         self.metadata_file_path = metadata_file_path
@@ -15,7 +98,9 @@ class AudioVisualizer:
     def load_audio(self):
         if not os.path.exists(self.audio_file_path):
             raise FileNotFoundError(f"Audio file not found: {self.audio_file_path}")
-        pass
+        waveform, sample_rate = torchaudio.load(self.audio_file_path)
+        # Keep the samples on the GPU so the spectrogram and the model never copy them back
+        return waveform.to(self.device), sample_rate
 
     def load_metadata(self):
         if not os.path.exists(self.metadata_file_path):
@@ -24,5 +109,9 @@ class AudioVisualizer:
             metadata = json.load(f)
         return metadata
     
-    def make_melspectrogram(self, audio_data, hoge):
-        pass
\ No newline at end of file
+    def make_melspectrogram(self, audio_data, to_numpy=False):
+        # (channels, n_mels, frames); only copied to the CPU when it is going to be plotted
+        mel = MelBatchExtractor.melspectrogram(audio_data, self.sample_rate)
+        if to_numpy:
+            return mel.cpu().numpy()
+        return mel